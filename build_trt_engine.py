@@ -0,0 +1,205 @@
+"""
+Build a mixed-precision INT8/FP16 TensorRT engine for the hand keypoint model
+Pure INT8 pose engines can lose all detections, so the high-range layers
+(stem convolutions and the keypoint/DFL head) are pinned to FP16
+"""
+
+import json
+import re
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+from ultralytics import YOLO
+
+try:
+    import tensorrt as trt
+except ImportError:
+    trt = None
+
+def letterbox(image, size):
+    """
+    Resize an image onto a square canvas the way Ultralytics preprocesses it
+    
+    Args:
+        image: Input image (BGR)
+        size: Side length of the output canvas
+    
+    Returns:
+        Padded image (BGR)
+    """
+    height, width = image.shape[:2]
+    ratio = min(size / height, size / width)
+    new_height, new_width = round(height * ratio), round(width * ratio)
+    resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - new_height) // 2, (size - new_width) // 2
+    canvas[top:top + new_height, left:left + new_width] = resized
+    return canvas
+
+if trt is not None:
+    class ValCalibrator(trt.IInt8EntropyCalibrator2):
+        """Entropy calibrator fed with letterboxed validation images"""
+        
+        def __init__(self, image_paths, imgsz, batch, cache_file):
+            super().__init__()
+            self.image_paths = image_paths
+            self.imgsz = imgsz
+            self.batch = batch
+            self.cache_file = Path(cache_file)
+            self.position = 0
+            self.device_batch = torch.empty((batch, 3, imgsz, imgsz), dtype=torch.float32, device='cuda')
+        
+        def get_batch_size(self):
+            return self.batch
+        
+        def get_batch(self, names):
+            if self.position + self.batch > len(self.image_paths):
+                return None
+            
+            images = []
+            for path in self.image_paths[self.position:self.position + self.batch]:
+                image = cv2.imread(str(path))
+                image = cv2.cvtColor(letterbox(image, self.imgsz), cv2.COLOR_BGR2RGB)
+                images.append(image.transpose(2, 0, 1))
+            self.position += self.batch
+            
+            host_batch = np.ascontiguousarray(np.stack(images), dtype=np.float32) / 255.0
+            self.device_batch.copy_(torch.from_numpy(host_batch))
+            return [int(self.device_batch.data_ptr())]
+        
+        def read_calibration_cache(self):
+            if self.cache_file.exists():
+                return self.cache_file.read_bytes()
+            return None
+        
+        def write_calibration_cache(self, cache):
+            self.cache_file.write_bytes(bytes(cache))
+
+def find_fp16_layers(network):
+    """
+    Pick the layers that should stay in FP16
+    
+    The first two convolutions see raw pixel ranges, and the pose head's
+    keypoint (cv4) and DFL convolutions regress coordinates; quantizing
+    either collapses the keypoint confidences.
+    
+    Args:
+        network: Parsed TensorRT network
+    
+    Returns:
+        List of layers to pin to FP16
+    """
+    convs = [network.get_layer(i) for i in range(network.num_layers)
+             if network.get_layer(i).type == trt.LayerType.CONVOLUTION]
+    
+    # The head is the last "/model.N/" module in the exported graph
+    module_indices = [int(m.group(1)) for m in (re.search(r"/model\.(\d+)/", layer.name) for layer in convs) if m]
+    head_prefix = f"/model.{max(module_indices)}/" if module_indices else None
+    
+    head_convs = [layer for layer in convs
+                  if head_prefix and head_prefix in layer.name and ("cv4" in layer.name or "dfl" in layer.name)]
+    return convs[:2] + head_convs
+
+def build_mixed_precision_engine(model_path, data_dir="hand_keypoint_subset", imgsz=416, batch=8,
+                                 workspace_gb=4, max_calibration_images=512):
+    """
+    Build a mixed INT8/FP16 TensorRT engine next to the trained weights
+    
+    Args:
+        model_path: Path to the trained model (.pt file)
+        data_dir: Dataset directory whose images/val split is used for calibration
+        imgsz: Image size the model was trained at (the engine accepts up to twice that)
+        batch: Largest batch size the engine accepts (also the calibration batch)
+        workspace_gb: Builder workspace limit in GB
+        max_calibration_images: Cap on the number of calibration images
+    
+    Returns:
+        Path to the engine, or None if it could not be built
+    """
+    if trt is None:
+        print("⚠️  TensorRT is not installed, skipping mixed-precision engine build")
+        return None
+    if not torch.cuda.is_available():
+        print("⚠️  CUDA is not available, skipping mixed-precision engine build")
+        return None
+    
+    calibration_images = sorted((Path(data_dir) / "images" / "val").glob("*.jpg"))[:max_calibration_images]
+    if len(calibration_images) < batch:
+        print(f"❌ Not enough calibration images in {data_dir}/images/val")
+        return None
+    
+    print("⚙️  Building mixed-precision INT8/FP16 TensorRT engine...")
+    try:
+        onnx_path = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+        
+        logger = trt.Logger(trt.Logger.WARNING)
+        builder = trt.Builder(logger)
+        network = builder.create_network(1 << int(trt.NetworkDefinitionCreationFlag.EXPLICIT_BATCH))
+        parser = trt.OnnxParser(network, logger)
+        if not parser.parse_from_file(str(onnx_path)):
+            for i in range(parser.num_errors):
+                print(f"❌ ONNX parse error: {parser.get_error(i)}")
+            return None
+        
+        config = builder.create_builder_config()
+        if hasattr(config, 'set_memory_pool_limit'):
+            config.set_memory_pool_limit(trt.MemoryPoolType.WORKSPACE, workspace_gb << 30)
+        else:
+            config.max_workspace_size = workspace_gb << 30
+        config.set_flag(trt.BuilderFlag.INT8)
+        config.set_flag(trt.BuilderFlag.FP16)
+        config.set_flag(getattr(trt.BuilderFlag, 'OBEY_PRECISION_CONSTRAINTS', None) or trt.BuilderFlag.STRICT_TYPES)
+        
+        # Dynamic batch and input size, like Ultralytics' own dynamic export: it
+        # letterboxes to the caller's imgsz (640 by default) or to rect shapes
+        # in val, so H/W range from 32 up to twice the training resolution.
+        # INT8 calibration runs at the opt shape, the training resolution
+        input_name = network.get_input(0).name
+        max_side = 2 * imgsz
+        profile = builder.create_optimization_profile()
+        profile.set_shape(input_name, (1, 3, 32, 32), (batch, 3, imgsz, imgsz), (batch, 3, max_side, max_side))
+        config.add_optimization_profile(profile)
+        config.set_calibration_profile(profile)
+        
+        fp16_layers = find_fp16_layers(network)
+        for layer in fp16_layers:
+            layer.precision = trt.float16
+            layer.set_output_type(0, trt.float16)
+        print(f"   Pinned {len(fp16_layers)} layers to FP16, calibrating on {len(calibration_images)} images")
+        
+        engine_path = Path(model_path).with_suffix(".engine")
+        config.int8_calibrator = ValCalibrator(
+            calibration_images, imgsz, batch, engine_path.with_name("calibration.cache")
+        )
+        
+        serialized = builder.build_serialized_network(network, config)
+        if serialized is None:
+            print("❌ TensorRT engine build failed")
+            return None
+        
+        # Prefix the same metadata header Ultralytics writes, so YOLO() can load the engine
+        import onnx  # Installed by the Ultralytics ONNX export above
+        metadata = {prop.key: prop.value for prop in onnx.load(str(onnx_path)).metadata_props}
+        metadata_bytes = json.dumps(metadata).encode()
+        with open(engine_path, 'wb') as f:
+            f.write(len(metadata_bytes).to_bytes(4, byteorder='little', signed=True))
+            f.write(metadata_bytes)
+            f.write(serialized)
+        
+        print(f"✅ Mixed-precision engine saved to: {engine_path}")
+        return str(engine_path)
+    
+    except Exception as e:
+        print(f"❌ Mixed-precision engine build failed: {e}")
+        return None
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python build_trt_engine.py <best.pt> [imgsz]")
+        sys.exit(1)
+    
+    build_mixed_precision_engine(sys.argv[1], imgsz=int(sys.argv[2]) if len(sys.argv) > 2 else 416)
@@ -4,14 +4,210 @@ Samples 3000 training images and 1000 validation images
 """
 
 import os
+import errno
 import shutil
 import random
+import hashlib
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-import json
+import orjson
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+def sample_jpgs(directory, k):
+    """
+    Reservoir-sample k .jpg entries from a directory in one scandir pass
+    
+    Uses Algorithm R, so only the k sampled DirEntry objects are kept in memory
+    rather than the full directory listing.
+    
+    Returns:
+        Tuple of (sampled DirEntry list, total number of .jpg files seen)
+    """
+    reservoir = []
+    count = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.name.endswith('.jpg'):
+                continue
+            if count < k:
+                reservoir.append(entry)
+            else:
+                j = random.randrange(count + 1)
+                if j < k:
+                    reservoir[j] = entry
+            count += 1
+    return reservoir, count
+
+def sendfile_copy(src, dst):
+    """Copy a file in kernel space with os.sendfile, preserving metadata like copy2"""
+    # Opening dst for writing would truncate src if both are the same file
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    
+    if not hasattr(os, "sendfile"):
+        shutil.copy2(src, dst)
+        return
+    
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+    except OSError:
+        # e.g. macOS, where sendfile only writes to sockets
+        shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+
+# Errors meaning "hardlinks can't be used here", as opposed to real failures
+LINK_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP}
+
+def link_or_copy(src, dst):
+    """Hardlink src to dst, falling back to a real copy
+    
+    A hardlink moves no data, which is all the subset needs when it lives on
+    the same filesystem as the source. An existing link to src is left alone
+    and any other existing dst is replaced; only filesystems that can't
+    hardlink (cross-device, not permitted or unsupported) get a byte copy.
+    """
+    try:
+        os.link(src, dst)
+        return
+    except FileExistsError:
+        if os.path.samefile(src, dst):
+            return
+        os.unlink(dst)
+    except OSError as e:
+        if e.errno not in LINK_UNSUPPORTED_ERRNOS:
+            raise
+        sendfile_copy(src, dst)
+        return
+    
+    # The stale dst was removed; link again
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno not in LINK_UNSUPPORTED_ERRNOS:
+            raise
+        sendfile_copy(src, dst)
+
+def split_dir(root, kind, split):
+    """Directory path for a split with a trailing separator, for cheap concatenation"""
+    return os.path.join(root, kind, split) + os.sep
+
+def list_label_stems(directory):
+    """Stems of all .txt label files in a directory, from a single scandir pass"""
+    try:
+        with os.scandir(directory) as it:
+            return {entry.name[:-4] for entry in it if entry.name.endswith('.txt')}
+    except FileNotFoundError:
+        return set()
+
+def copy_image_and_label(entry, label_stems, dst_img_dir, src_lbl_dir, dst_lbl_dir):
+    """Copy one image and its label file (if any) into the subset"""
+    stem = entry.name[:-4]
+    link_or_copy(entry.path, dst_img_dir + entry.name)
+    
+    if stem in label_stems:
+        link_or_copy(src_lbl_dir + stem + ".txt", dst_lbl_dir + stem + ".txt")
+
+def copy_split(entries, label_stems, source_dir, dest_dir, split, progress_every, max_workers=16):
+    """Copy sampled images and labels for a split using a thread pool
+    
+    File copies are I/O-bound and release the GIL, so threads overlap the
+    per-file syscall latency.
+    """
+    dst_img_dir = split_dir(dest_dir, "images", split)
+    src_lbl_dir = split_dir(source_dir, "labels", split)
+    dst_lbl_dir = split_dir(dest_dir, "labels", split)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(copy_image_and_label, entry, label_stems, dst_img_dir, src_lbl_dir, dst_lbl_dir)
+            for entry in entries
+        ]
+        for i, future in enumerate(as_completed(futures)):
+            if i % progress_every == 0:
+                print(f"  {split} progress: {i}/{len(entries)}")
+            future.result()
+
+def batch_copy_split(entries, label_stems, source_dir, dest_dir, split, chunk_size=1000):
+    """Hardlink a whole split with a few `cp` processes instead of per-file calls
+    
+    Returns False if `cp` is unavailable or fails (e.g. cross-device links or a
+    non-GNU cp), so the caller can fall back to copy_split.
+    """
+    if shutil.which("cp") is None:
+        return False
+    
+    src_lbl_dir = split_dir(source_dir, "labels", split)
+    images = [entry.path for entry in entries]
+    labels = [
+        src_lbl_dir + entry.name[:-4] + ".txt"
+        for entry in entries
+        if entry.name[:-4] in label_stems
+    ]
+    
+    for files, target_dir in [
+        (images, split_dir(dest_dir, "images", split)),
+        (labels, split_dir(dest_dir, "labels", split))
+    ]:
+        for start in range(0, len(files), chunk_size):
+            result = subprocess.run(
+                ["cp", "--link", "--force", "--target-directory", target_dir, *files[start:start + chunk_size]],
+                capture_output=True
+            )
+            if result.returncode != 0:
+                return False
+    
+    return True
+
+def copy_split_files(entries, source_dir, dest_dir, split, progress_every):
+    """Copy a split with batched cp, falling back to the threaded per-file copy"""
+    # One directory scan instead of a stat() per sampled image
+    label_stems = list_label_stems(os.path.join(source_dir, "labels", split))
+    
+    if not batch_copy_split(entries, label_stems, source_dir, dest_dir, split):
+        copy_split(entries, label_stems, source_dir, dest_dir, split, progress_every=progress_every)
+
+def subset_digest(seed, sampled_train, sampled_val):
+    """Hash the seed and sampled file names that define a subset"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(seed).encode())
+    for entries in (sampled_train, sampled_val):
+        digest.update(b"\n" + b"\0".join(sorted(entry.name.encode() for entry in entries)))
+    return digest.hexdigest()
+
+def subset_up_to_date(dest_dir, digest, expected_counts):
+    """
+    Check whether dest_dir already holds the subset described by digest
+    
+    The lock file must match and each split must still contain the expected
+    number of images, which catches interrupted or partially deleted copies.
+    """
+    lock_path = dest_dir / "subset.lock"
+    if not lock_path.exists() or lock_path.read_text().strip() != digest:
+        return False
+    
+    for split, expected in expected_counts.items():
+        with os.scandir(dest_dir / "images" / split) as it:
+            if sum(1 for entry in it if entry.name.endswith('.jpg')) != expected:
+                return False
+    return True
 
 def create_dataset_subset():
     # Set random seed for reproducibility
-    random.seed(42)
+    seed = 42
+    random.seed(seed)
     
     # Source and destination paths
     source_dir = Path("hand_keypoint_dataset_26k/hand_keypoint_dataset_26k")
@@ -26,77 +222,56 @@ def create_dataset_subset():
     (dest_dir / "coco_annotation" / "train").mkdir(parents=True, exist_ok=True)
     (dest_dir / "coco_annotation" / "val").mkdir(parents=True, exist_ok=True)
     
-    # Get all training images
-    train_images_dir = source_dir / "images" / "train"
-    train_images = list(train_images_dir.glob("*.jpg"))
-    print(f"Found {len(train_images)} training images")
-    
-    # Get all validation images
-    val_images_dir = source_dir / "images" / "val"
-    val_images = list(val_images_dir.glob("*.jpg"))
-    print(f"Found {len(val_images)} validation images")
-    
     # Sample training images (3000)
-    if len(train_images) >= 3000:
-        sampled_train = random.sample(train_images, 3000)
-    else:
-        sampled_train = train_images
-        print(f"Warning: Only {len(train_images)} training images available, using all")
+    train_images_dir = source_dir / "images" / "train"
+    sampled_train, train_count = sample_jpgs(train_images_dir, 3000)
+    print(f"Found {train_count} training images")
+    if train_count < 3000:
+        print(f"Warning: Only {train_count} training images available, using all")
     
     # Sample validation images (1000)
-    if len(val_images) >= 1000:
-        sampled_val = random.sample(val_images, 1000)
-    else:
-        sampled_val = val_images
-        print(f"Warning: Only {len(val_images)} validation images available, using all")
+    val_images_dir = source_dir / "images" / "val"
+    sampled_val, val_count = sample_jpgs(val_images_dir, 1000)
+    print(f"Found {val_count} validation images")
+    if val_count < 1000:
+        print(f"Warning: Only {val_count} validation images available, using all")
     
     print(f"Sampling {len(sampled_train)} training images and {len(sampled_val)} validation images")
     
-    # Copy training files
-    print("Copying training files...")
-    for i, img_path in enumerate(sampled_train):
-        if i % 500 == 0:
-            print(f"  Progress: {i}/{len(sampled_train)}")
-        
-        # Copy image
-        dest_img = dest_dir / "images" / "train" / img_path.name
-        shutil.copy2(img_path, dest_img)
-        
-        # Copy corresponding label
-        label_path = source_dir / "labels" / "train" / (img_path.stem + ".txt")
-        if label_path.exists():
-            dest_label = dest_dir / "labels" / "train" / (img_path.stem + ".txt")
-            shutil.copy2(label_path, dest_label)
-    
-    # Copy validation files
-    print("Copying validation files...")
-    for i, img_path in enumerate(sampled_val):
-        if i % 200 == 0:
-            print(f"  Progress: {i}/{len(sampled_val)}")
+    # Skip all copying if the existing subset was built from the same sample
+    digest = subset_digest(seed, sampled_train, sampled_val)
+    if subset_up_to_date(dest_dir, digest, {"train": len(sampled_train), "val": len(sampled_val)}):
+        print(f"\n✅ Dataset subset is up-to-date: {dest_dir.absolute()}")
+        return
+    
+    # Copy both splits in the background while the COCO annotations are filtered,
+    # so file I/O overlaps with JSON parsing instead of running back to back
+    print("Copying training and validation files...")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        copy_jobs = [
+            executor.submit(copy_split_files, sampled_train, source_dir, dest_dir, "train", 500),
+            executor.submit(copy_split_files, sampled_val, source_dir, dest_dir, "val", 200)
+        ]
         
-        # Copy image
-        dest_img = dest_dir / "images" / "val" / img_path.name
-        shutil.copy2(img_path, dest_img)
+        # Create subset COCO annotations (simplified version)
+        print("Creating COCO annotations...")
+        create_subset_coco_annotations(source_dir, dest_dir, sampled_train, sampled_val)
         
-        # Copy corresponding label
-        label_path = source_dir / "labels" / "val" / (img_path.stem + ".txt")
-        if label_path.exists():
-            dest_label = dest_dir / "labels" / "val" / (img_path.stem + ".txt")
-            shutil.copy2(label_path, dest_label)
-    
-    # Create subset COCO annotations (simplified version)
-    print("Creating COCO annotations...")
-    create_subset_coco_annotations(source_dir, dest_dir, sampled_train, sampled_val)
+        for job in copy_jobs:
+            job.result()
     
     # Copy the hand landmarks visualization
     landmarks_src = source_dir / "hand_landmarks.png"
     if landmarks_src.exists():
-        shutil.copy2(landmarks_src, dest_dir / "hand_landmarks.png")
+        link_or_copy(landmarks_src, dest_dir / "hand_landmarks.png")
     
     # Copy readme
     readme_src = source_dir / "readme.txt"
     if readme_src.exists():
-        shutil.copy2(readme_src, dest_dir / "readme.txt")
+        link_or_copy(readme_src, dest_dir / "readme.txt")
+    
+    # Record the subset only once everything has been written
+    (dest_dir / "subset.lock").write_text(digest)
     
     print(f"\n✅ Dataset subset created successfully!")
     print(f"📁 Location: {dest_dir.absolute()}")
@@ -104,6 +279,59 @@ def create_dataset_subset():
     print(f"📊 Validation images: {len(sampled_val)}")
     print(f"📊 Total images: {len(sampled_train) + len(sampled_val)}")
 
+def load_coco_subset(coco_path, sampled_names):
+    """
+    Load the COCO header plus only the images/annotations in the sampled subset
+    
+    sampled_names are image file names including the .jpg extension, matching
+    COCO's file_name field directly.
+    
+    With ijson available the file is streamed, so the full image and annotation
+    lists are never materialized; otherwise the whole file is parsed with orjson.
+    
+    Returns:
+        Tuple of (header dict with info/licenses/categories, images, annotations)
+    """
+    header_keys = ('info', 'licenses', 'categories')
+    
+    if ijson is None:
+        with open(coco_path, 'rb') as f:
+            coco_data = orjson.loads(f.read())
+        
+        header = {key: coco_data[key] for key in header_keys}
+        
+        # Index once so selecting the subset scales with what is kept
+        images_by_name = {img['file_name']: img for img in coco_data['images']}
+        annotations_by_image = defaultdict(list)
+        for ann in coco_data['annotations']:
+            annotations_by_image[ann['image_id']].append(ann)
+        
+        subset_images = [images_by_name[name] for name in sorted(sampled_names) if name in images_by_name]
+        subset_annotations = [ann for img in subset_images for ann in annotations_by_image[img['id']]]
+        return header, subset_images, subset_annotations
+    
+    with open(coco_path, 'rb') as f:
+        # Header sections sit at the top of the file, so each lookup stops early
+        header = {}
+        for key in header_keys:
+            f.seek(0)
+            header[key] = next(ijson.items(f, key, use_float=True))
+        
+        f.seek(0)
+        subset_images = [
+            img for img in ijson.items(f, 'images.item', use_float=True)
+            if img['file_name'] in sampled_names
+        ]
+        subset_image_ids = {img['id'] for img in subset_images}
+        
+        f.seek(0)
+        subset_annotations = [
+            ann for ann in ijson.items(f, 'annotations.item', use_float=True)
+            if ann['image_id'] in subset_image_ids
+        ]
+    
+    return header, subset_images, subset_annotations
+
 def create_subset_coco_annotations(source_dir, dest_dir, sampled_train, sampled_val):
     """Create simplified COCO annotations for the subset"""
     
@@ -117,30 +345,23 @@ def create_subset_coco_annotations(source_dir, dest_dir, sampled_train, sampled_
         ("val", sampled_val, val_coco_path)
     ]:
         if coco_path.exists():
-            with open(coco_path, 'r') as f:
-                coco_data = json.load(f)
-            
             # Get image names from sampled images
-            sampled_names = {img.stem for img in sampled_images}
+            sampled_names = {entry.name for entry in sampled_images}
             
             # Filter images and annotations
-            subset_images = [img for img in coco_data['images'] if img['file_name'].replace('.jpg', '') in sampled_names]
-            subset_image_ids = {img['id'] for img in subset_images}
-            subset_annotations = [ann for ann in coco_data['annotations'] if ann['image_id'] in subset_image_ids]
+            coco_header, subset_images, subset_annotations = load_coco_subset(coco_path, sampled_names)
             
             # Create subset COCO data
             subset_coco = {
-                'info': coco_data['info'],
-                'licenses': coco_data['licenses'],
-                'categories': coco_data['categories'],
+                **coco_header,
                 'images': subset_images,
                 'annotations': subset_annotations
             }
             
             # Save subset COCO annotation
             subset_coco_path = dest_dir / "coco_annotation" / split / "_annotations.coco.json"
-            with open(subset_coco_path, 'w') as f:
-                json.dump(subset_coco, f, indent=2)
+            with open(subset_coco_path, 'wb') as f:
+                f.write(orjson.dumps(subset_coco, option=orjson.OPT_INDENT_2))
             
             print(f"  Created {split} COCO annotation with {len(subset_images)} images and {len(subset_annotations)} annotations")
 
@@ -104,53 +104,111 @@ const verifyToken = (req, res, next) => {
 };
 
 // Helper function to call Python palm API
+// Long-lived Python palm API process: the model is loaded once and
+// requests are exchanged as newline-delimited JSON over stdin/stdout
+let palmProcess = null;
+let palmStdoutBuffer = '';
+let nextPalmRequestId = 1;
+const pendingPalmRequests = new Map();
+
+// A request the daemon hasn't answered within this time is failed; the first
+// request also waits for the model to load, so leave generous headroom
+const PALM_REQUEST_TIMEOUT_MS = parseInt(process.env.PALM_REQUEST_TIMEOUT_MS, 10) || 120000;
+
+const startPalmProcess = () => {
+  const pythonPath = process.env.PYTHON_PATH || 'python';
+  const scriptPath = path.join(__dirname, '..', 'palm_api.py');
+  
+  console.log(`🐍 Starting Python palm API: ${pythonPath} ${scriptPath} serve`);
+  
+  const python = spawn(pythonPath, [scriptPath, 'serve']);
+  palmStdoutBuffer = '';
+  
+  // Decode as a stream so multi-byte characters split across chunks survive
+  python.stdout.setEncoding('utf8');
+  python.stderr.setEncoding('utf8');
+  
+  python.stdout.on('data', (data) => {
+    palmStdoutBuffer += data;
+    
+    let newlineIndex;
+    while ((newlineIndex = palmStdoutBuffer.indexOf('\n')) !== -1) {
+      const line = palmStdoutBuffer.slice(0, newlineIndex);
+      palmStdoutBuffer = palmStdoutBuffer.slice(newlineIndex + 1);
+      if (!line.trim()) continue;
+      
+      let result;
+      try {
+        result = JSON.parse(line);
+      } catch (error) {
+        console.error(`❌ Failed to parse Python output: ${line}`);
+        continue;
+      }
+      
+      const pending = pendingPalmRequests.get(result.id);
+      if (!pending) continue;
+      pendingPalmRequests.delete(result.id);
+      clearTimeout(pending.timer);
+      delete result.id;
+      
+      console.log(`✅ Python result:`, result);
+      pending.resolve(result);
+    }
+  });
+  
+  python.stderr.on('data', (data) => {
+    console.log(`🐍 Python stderr: ${data}`);
+  });
+  
+  python.on('close', (code) => {
+    console.log(`🐍 Python process exited with code ${code}`);
+    if (palmProcess === python) {
+      palmProcess = null;
+    }
+    
+    // Fail anything still in flight on this process; the next call restarts it
+    for (const [id, pending] of pendingPalmRequests) {
+      if (pending.python !== python) continue;
+      clearTimeout(pending.timer);
+      pendingPalmRequests.delete(id);
+      pending.reject(new Error(`Python process failed with code ${code}`));
+    }
+  });
+  
+  python.on('error', (error) => {
+    console.error(`❌ Failed to start Python process:`, error);
+  });
+  
+  python.stdin.on('error', (error) => {
+    console.error(`❌ Failed to write to Python process:`, error);
+  });
+  
+  return python;
+};
+
 const callPythonPalmAPI = (command, args = []) => {
   return new Promise((resolve, reject) => {
     console.log(`🐍 Calling Python API: ${command} ${args.join(' ')}`);
     
-    const pythonPath = process.env.PYTHON_PATH || 'python';
-    const scriptPath = path.join(__dirname, '..', 'palm_api.py');
-    const pythonArgs = [scriptPath, command, ...args];
-    
-    console.log(`🐍 Python command: ${pythonPath} ${pythonArgs.join(' ')}`);
-    
-    const python = spawn(pythonPath, pythonArgs);
-    
-    let stdout = '';
-    let stderr = '';
-    
-    python.stdout.on('data', (data) => {
-      stdout += data.toString();
-    });
-    
-    python.stderr.on('data', (data) => {
-      stderr += data.toString();
-      console.log(`🐍 Python stderr: ${data.toString()}`);
-    });
+    if (!palmProcess) {
+      palmProcess = startPalmProcess();
+    }
     
-    python.on('close', (code) => {
-      console.log(`🐍 Python process exited with code ${code}`);
-      
-      if (code !== 0) {
-        console.error(`❌ Python error: ${stderr}`);
-        reject(new Error(`Python process failed with code ${code}`));
-        return;
-      }
-      
-      try {
-        const result = JSON.parse(stdout);
-        console.log(`✅ Python result:`, result);
-        resolve(result);
-      } catch (error) {
-        console.error(`❌ Failed to parse Python output: ${stdout}`);
-        reject(new Error('Failed to parse Python response'));
+    const id = nextPalmRequestId++;
+    const python = palmProcess;
+    const timer = setTimeout(() => {
+      if (!pendingPalmRequests.delete(id)) return;
+      console.error(`❌ Python API request ${id} (${command}) timed out after ${PALM_REQUEST_TIMEOUT_MS} ms`);
+      reject(new Error(`Python API request timed out after ${PALM_REQUEST_TIMEOUT_MS} ms`));
+      // Requests are answered in order, so a hung daemon would time out every
+      // later one too; kill it and let the next call start a fresh one
+      if (palmProcess === python) {
+        palmProcess = null;
       }
-    });
-    
-    python.on('error', (error) => {
-      console.error(`❌ Failed to start Python process:`, error);
-      reject(error);
-    });
+      python.kill();
+    }, PALM_REQUEST_TIMEOUT_MS);
+    pendingPalmRequests.set(id, { resolve, reject, timer, python });
+    palmProcess.stdin.write(JSON.stringify({ id, command, args }) + '\n');
   });
 };
 
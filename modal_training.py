@@ -10,6 +10,32 @@ from pathlib import Path
 # Create Modal app
 app = modal.App("hand-keypoint-training")
 
+# The dataset is shipped as one archive: thousands of small files upload far
+# slower than a single tar. JPEGs are already compressed, so it is left uncompressed.
+DATASET_DIR = "hand_keypoint_subset"
+DATASET_ARCHIVE = "hand_keypoint_subset.tar"
+REMOTE_DATASET_ARCHIVE = "/tmp/hand_keypoint_subset.tar"
+
+def build_dataset_archive():
+    """Pack the local dataset subset into a tar, reusing it if the subset is unchanged"""
+    import tarfile
+    
+    subset_dir = Path(DATASET_DIR)
+    archive_path = Path(DATASET_ARCHIVE)
+    if not subset_dir.exists():
+        return
+    
+    lock_path = subset_dir / "subset.lock"
+    if archive_path.exists() and lock_path.exists() and archive_path.stat().st_mtime >= lock_path.stat().st_mtime:
+        return
+    
+    print(f"📦 Packing {subset_dir} into {archive_path}...")
+    with tarfile.open(archive_path, "w") as tar:
+        tar.add(subset_dir, arcname=DATASET_DIR)
+
+if modal.is_local():
+    build_dataset_archive()
+
 # Define the image with all dependencies and add the dataset
 image = (modal.Image.debian_slim(python_version="3.10")
          .pip_install([
@@ -23,9 +49,15 @@ image = (modal.Image.debian_slim(python_version="3.10")
              "matplotlib",
              "seaborn",
              "pandas",
-             "tqdm"
+             "tqdm",
+             "onnx",      # TensorRT engines are built from an ONNX export
+             "tensorrt"   # INT8 engine export after training
          ])
-         .add_local_dir("hand_keypoint_subset", remote_path="/data/hand_keypoint_subset"))
+         .env({
+             "PYTHONUNBUFFERED": "1",  # Stream training logs immediately
+             "OMP_NUM_THREADS": "4"    # Avoid oversubscribing CPUs alongside dataloader workers
+         })
+         .add_local_file(DATASET_ARCHIVE, remote_path=REMOTE_DATASET_ARCHIVE))
 
 # Create a volume to store the dataset and results
 volume = modal.Volume.from_name("hand-keypoint-data", create_if_missing=True)
@@ -44,6 +76,7 @@ def train_hand_keypoints():
     from ultralytics import YOLO
     import yaml
     import shutil
+    import tarfile
     from pathlib import Path
     
     print("🚀 Starting hand keypoint training on Modal...")
@@ -52,8 +85,14 @@ def train_hand_keypoints():
         print(f"GPU: {torch.cuda.get_device_name(0)}")
         print(f"GPU Memory: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.1f} GB")
     
-    # Check if dataset exists
+    # Extract the uploaded dataset archive once
     dataset_path = Path("/data/hand_keypoint_subset")
+    if not dataset_path.exists() and Path(REMOTE_DATASET_ARCHIVE).exists():
+        print("📦 Extracting dataset archive...")
+        with tarfile.open(REMOTE_DATASET_ARCHIVE) as tar:
+            tar.extractall("/data")
+    
+    # Check if dataset exists
     if not dataset_path.exists():
         print("❌ Dataset not found. The dataset should be mounted from local directory.")
         return None
@@ -93,6 +132,13 @@ def train_hand_keypoints():
     print("📥 Loading YOLOv8 pose model...")
     model = YOLO('yolo11n-pose.pt')
     
+    # Ultralytics rebuilds the model inside the trainer, so switch that instance
+    # to NHWC once it is on the GPU; AMP convs then use Tensor Core-friendly strides
+    def use_channels_last(trainer):
+        trainer.model.to(memory_format=torch.channels_last)
+    
+    model.add_callback("on_pretrain_routine_end", use_channels_last)
+    
     # Training parameters optimized for Modal GPU
     training_args = {
         'data': str(config_path),
@@ -101,6 +147,7 @@ def train_hand_keypoints():
         'batch': 32,    # Larger batch size for GPU
         'device': 'cuda',
         'workers': 8,   # More workers for faster data loading
+        'cache': 'ram', # Decode the ~3000 training JPEGs once instead of every epoch
         'patience': 15,
         'save_period': 10,
         'project': '/results/training_results',
@@ -150,12 +197,7 @@ def train_hand_keypoints():
         'profile': False,
         'freeze': None,
         'multi_scale': False,
-        'overlap_mask': True,
-        'mask_ratio': 4,
-        'dropout': 0.0,
-        'val': True,
         'split': 'val',
-        'save_dir': '/results/training_results',
         'verbose': True,
         'seed': 42,
         'deterministic': True
@@ -174,14 +216,33 @@ def train_hand_keypoints():
         print("\n✅ Training completed successfully!")
         print(f"📁 Results saved in: {results.save_dir}")
         
+        # Export an INT8 TensorRT engine for deployment, calibrated on the val split
+        best_model = f"{results.save_dir}/weights/best.pt"
+        engine_model = None
+        try:
+            print("⚙️  Exporting INT8 TensorRT engine...")
+            engine_model = YOLO(best_model).export(
+                format='engine',
+                device=0,
+                half=True,
+                int8=True,
+                data=str(config_path),
+                imgsz=training_args['imgsz'],
+                workspace=4
+            )
+            print(f"✅ TensorRT engine saved to: {engine_model}")
+        except Exception as e:
+            print(f"⚠️  TensorRT export failed, keeping PyTorch weights only: {e}")
+        
         # Commit the volume to save results
         volume.commit()
         
         return {
             'success': True,
             'save_dir': str(results.save_dir),
-            'best_model': f"{results.save_dir}/weights/best.pt",
-            'last_model': f"{results.save_dir}/weights/last.pt"
+            'best_model': best_model,
+            'last_model': f"{results.save_dir}/weights/last.pt",
+            'engine_model': str(engine_model) if engine_model else None
         }
         
     except Exception as e:
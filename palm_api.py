@@ -5,11 +5,18 @@ Stores minimal data: phone number + palm signature measurements
 """
 
 import sys
-import json
 import os
+import traceback
+import orjson
+import numpy as np
 from pathlib import Path
-from palm_recognition_system import PalmRecognitionSystem
-from datetime import datetime
+from palm_recognition_system import PalmRecognitionSystem, DISTANCE_KEYS, distances_to_vector
+from datetime import datetime, timezone
+
+try:
+    import torch
+except ImportError:
+    torch = None
 
 # Get the script's directory to build absolute paths
 SCRIPT_DIR = Path(__file__).resolve().parent
@@ -22,26 +29,249 @@ PALM_DATA_DIR.mkdir(exist_ok=True)
 TEMP_IMAGE_DIR = PALM_DATA_DIR / "temp_images"
 TEMP_IMAGE_DIR.mkdir(exist_ok=True)
 
+# Stacked templates of all registered palms (N x D float32, memory-mapped for
+# matching), with the phone number of each row on the matching line of phones.txt
+TEMPLATE_STORE_PATH = PALM_DATA_DIR / "templates.bin"
+TEMPLATE_PHONES_PATH = PALM_DATA_DIR / "phones.txt"
+# Column order the store was built in; a store without it (or in another
+# order) is rebuilt
+TEMPLATE_KEYS_PATH = PALM_DATA_DIR / "template_keys.txt"
+# Random token rewritten on every change to the store, so a cached copy of it
+# can't survive an edit that leaves templates.bin's mtime and size unchanged
+TEMPLATE_GENERATION_PATH = PALM_DATA_DIR / "template_generation.txt"
+
+# Match on the GPU only once there are enough templates to outweigh the transfer
+GPU_MATCH_MIN_TEMPLATES = 4096
+
 # Model path
 MODEL_PATH = SCRIPT_DIR / "modal_training_results" / "best.pt"
 
+# Palm recognition system, loaded once per process and reused across requests
+_system = None
+
+# Template store copied to the GPU, with the generation and (mtime, size) of templates.bin it came from
+_templates_gpu = None
+_templates_gpu_key = None
+
+def get_system() -> PalmRecognitionSystem:
+    """Get the palm recognition system, loading the model on first use"""
+    global _system
+    if _system is None:
+        print("🤖 Initializing palm recognition system...", file=sys.stderr)
+        print(f"📂 Model path: {MODEL_PATH}", file=sys.stderr)
+        print(f"📂 Model exists: {MODEL_PATH.exists()}", file=sys.stderr)
+        _system = PalmRecognitionSystem(model_path=str(MODEL_PATH))
+    return _system
+
+def _np_default(obj):
+    """orjson fallback for numpy values OPT_SERIALIZE_NUMPY rejects (e.g. non-contiguous arrays)"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
 def get_palm_data_path(phone_number: str) -> Path:
     """Get the path to the palm data file for a phone number"""
     return PALM_DATA_DIR / f"{phone_number}.json"
 
+def get_palm_template_path(phone_number: str) -> Path:
+    """Get the path to the stored distance vector for a phone number"""
+    return PALM_DATA_DIR / f"{phone_number}.npy"
+
+def get_palm_last_used_path(phone_number: str) -> Path:
+    """Get the path of the lastUsed timestamp sidecar for a phone number"""
+    return PALM_DATA_DIR / f"{phone_number}.last"
+
+def iter_palm_files():
+    """Yield the paths of all stored palm JSON files in a single directory scan"""
+    with os.scandir(PALM_DATA_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file():
+                yield entry.path
+
+def load_stored_vector(palm_file: str, stored_data: dict) -> np.ndarray:
+    """
+    Load the distance vector for a stored palm (.npy, or legacy inline JSON)
+    
+    A .npy saved in another key order (older files used sorted-key order) is
+    reordered to DISTANCE_KEYS and rewritten in place. Raises ValueError for
+    a vector of the wrong length.
+    """
+    template_path = os.path.splitext(palm_file)[0] + '.npy'
+    if not os.path.exists(template_path):
+        return distances_to_vector(stored_data['normalizedDistances'])
+    
+    vector = np.ascontiguousarray(np.load(template_path), dtype=np.float32)
+    if vector.shape != (len(DISTANCE_KEYS),):
+        raise ValueError(f"expected {len(DISTANCE_KEYS)} distances, found shape {vector.shape}")
+    stored_keys = stored_data.get('distanceKeys', DISTANCE_KEYS)
+    if stored_keys != DISTANCE_KEYS:
+        vector = distances_to_vector(dict(zip(stored_keys, vector)))
+        migrate_stored_vector(palm_file, stored_data, vector)
+    return vector
+
+def migrate_stored_vector(palm_file: str, stored_data: dict, vector: np.ndarray):
+    """Rewrite a palm's .npy and its distanceKeys in DISTANCE_KEYS order"""
+    template_path = os.path.splitext(palm_file)[0] + '.npy'
+    with open(template_path + '.tmp', 'wb') as f:
+        np.save(f, vector)
+    os.replace(template_path + '.tmp', template_path)
+    
+    with open(palm_file + '.tmp', 'wb') as f:
+        f.write(orjson.dumps(dict(stored_data, distanceKeys=DISTANCE_KEYS)))
+    os.replace(palm_file + '.tmp', palm_file)
+    print(f"🔄 Migrated {os.path.basename(template_path)} to the current distance order", file=sys.stderr)
+
+def save_template_index(phones: list, templates: np.ndarray):
+    """Rewrite the template store: raw N x D float32 rows plus one phone per line"""
+    np.ascontiguousarray(templates, dtype=np.float32).tofile(TEMPLATE_STORE_PATH)
+    TEMPLATE_PHONES_PATH.write_text(''.join(f"{phone}\n" for phone in phones))
+    TEMPLATE_KEYS_PATH.write_text(''.join(f"{key}\n" for key in DISTANCE_KEYS))
+    bump_template_generation()
+
+def bump_template_generation():
+    """Mark the template store as changed"""
+    TEMPLATE_GENERATION_PATH.write_text(os.urandom(8).hex())
+
+def load_template_generation() -> str:
+    """Load the template store's current generation token"""
+    return TEMPLATE_GENERATION_PATH.read_text() if TEMPLATE_GENERATION_PATH.exists() else ''
+
+def template_index_is_current() -> bool:
+    """Whether the template store exists and its columns are in DISTANCE_KEYS order"""
+    return (TEMPLATE_STORE_PATH.exists() and TEMPLATE_PHONES_PATH.exists() and TEMPLATE_KEYS_PATH.exists()
+            and TEMPLATE_KEYS_PATH.read_text().split() == DISTANCE_KEYS)
+
+def rebuild_template_index() -> tuple:
+    """Rebuild the template store from the per-phone palm files"""
+    print("🔨 Rebuilding palm template index...", file=sys.stderr)
+    phones = []
+    vectors = []
+    for palm_file in iter_palm_files():
+        # A bad record (unparsable JSON, missing fields, an unreadable or
+        # wrong-length .npy) is skipped so it can't take down the whole rebuild
+        try:
+            with open(palm_file, 'rb') as f:
+                stored_data = orjson.loads(f.read())
+            phone_number = str(stored_data['phoneNumber'])
+            vector = load_stored_vector(palm_file, stored_data)
+        except (KeyError, ValueError, TypeError, EOFError, OSError) as e:
+            print(f"⚠️  Skipping corrupted file {os.path.basename(palm_file)}: {e}", file=sys.stderr)
+            continue
+        phones.append(phone_number)
+        vectors.append(vector)
+    
+    templates = np.stack(vectors) if vectors else np.empty((0, len(DISTANCE_KEYS)), dtype=np.float32)
+    save_template_index(phones, templates)
+    return np.array(phones, dtype=str), templates
+
+def load_template_phones() -> list:
+    """Load the phone numbers of the template store rows, in order"""
+    return TEMPLATE_PHONES_PATH.read_text().splitlines()
+
+def load_template_index() -> tuple:
+    """
+    Load (phones, templates) for all registered palms
+    
+    The templates are memory-mapped, so matching reads one contiguous file
+    regardless of how many palms are registered. The store is rebuilt from
+    the per-phone files if it is missing, outdated or inconsistent.
+    """
+    if not template_index_is_current():
+        return rebuild_template_index()
+    
+    phones = load_template_phones()
+    if not phones:
+        return np.array(phones, dtype=str), np.empty((0, len(DISTANCE_KEYS)), dtype=np.float32)
+    
+    # np.memmap can't map an empty file (e.g. rows lost after a crash)
+    if TEMPLATE_STORE_PATH.stat().st_size == 0:
+        print("⚠️  Palm template store is inconsistent", file=sys.stderr)
+        return rebuild_template_index()
+    
+    templates = np.memmap(TEMPLATE_STORE_PATH, dtype=np.float32, mode='r')
+    if templates.size % len(phones):
+        print("⚠️  Palm template store is inconsistent", file=sys.stderr)
+        del templates
+        return rebuild_template_index()
+    return np.array(phones, dtype=str), templates.reshape(len(phones), -1)
+
+def find_best_template(probe: np.ndarray, templates: np.ndarray) -> tuple:
+    """
+    Find the stored template closest to the probe
+    
+    Large stores are matched with one torch.cdist on the GPU, keeping the
+    templates resident there between calls; otherwise NumPy is used.
+    
+    Returns:
+        (index, distance) of the closest template
+    """
+    global _templates_gpu, _templates_gpu_key
+    
+    if torch is not None and len(templates) >= GPU_MATCH_MIN_TEMPLATES and torch.cuda.is_available():
+        stat = TEMPLATE_STORE_PATH.stat()
+        key = (load_template_generation(), stat.st_mtime_ns, stat.st_size)
+        if _templates_gpu is None or _templates_gpu_key != key:
+            _templates_gpu = torch.from_numpy(np.array(templates)).to('cuda')
+            _templates_gpu_key = key
+        
+        probe_gpu = torch.from_numpy(probe).to('cuda')
+        # The matmul expansion cdist uses for larger float32 inputs cancels
+        # badly for near-identical vectors, i.e. right at the match threshold
+        distances = torch.cdist(probe_gpu[None, :], _templates_gpu,
+                                compute_mode='donot_use_mm_for_euclid_dist').squeeze(0)
+        best_index = int(distances.argmin())
+        return best_index, float(distances[best_index])
+    
+    distances = np.linalg.norm(templates - probe, axis=1)
+    best_index = int(distances.argmin())
+    return best_index, float(distances[best_index])
+
+def update_template_index(phone_number: str, vector: np.ndarray = None):
+    """Add or replace (or with vector=None, remove) a phone's row in the template store"""
+    if not template_index_is_current():
+        rebuild_template_index()
+        return
+    
+    phones = load_template_phones()
+    if vector is not None and phone_number not in phones:
+        # New palm: append a row instead of rewriting the store
+        with open(TEMPLATE_STORE_PATH, 'ab') as f:
+            f.write(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+        with open(TEMPLATE_PHONES_PATH, 'a') as f:
+            f.write(f"{phone_number}\n")
+        bump_template_generation()
+        return
+    
+    phones, templates = load_template_index()
+    keep = phones != phone_number
+    phones, templates = list(phones[keep]), np.array(templates[keep])
+    if vector is not None:
+        phones.append(phone_number)
+        templates = np.vstack([templates.reshape(-1, vector.shape[0]), vector[None, :]])
+    save_template_index(phones, templates)
+
+def remove_palm_sidecars(phone_number: str):
+    """Remove the stored vector and lastUsed sidecars of a palm whose JSON is gone"""
+    for sidecar in (get_palm_template_path(phone_number), get_palm_last_used_path(phone_number)):
+        if sidecar.exists():
+            os.remove(sidecar)
+
 def load_palm_data(phone_number: str) -> dict:
     """Load palm data for a phone number"""
     path = get_palm_data_path(phone_number)
     if path.exists():
         print(f"📂 Loading existing palm data for {phone_number}", file=sys.stderr)
         try:
-            with open(path, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError as e:
+            return orjson.loads(path.read_bytes())
+        except orjson.JSONDecodeError as e:
             print(f"❌ Error: {e}", file=sys.stderr)
             print(f"⚠️  Corrupted palm data file found, deleting...", file=sys.stderr)
             try:
                 os.remove(path)
+                remove_palm_sidecars(phone_number)
+                update_template_index(phone_number)
                 print(f"🗑️  Deleted corrupted file: {path}", file=sys.stderr)
             except Exception as delete_error:
                 print(f"❌ Failed to delete corrupted file: {delete_error}", file=sys.stderr)
@@ -50,35 +280,40 @@ def load_palm_data(phone_number: str) -> dict:
     return None
 
 def save_palm_data(phone_number: str, palm_data: dict) -> bool:
-    """Save palm data for a phone number"""
+    """
+    Save palm data for a phone number
+    
+    Normalized distances are stored as a float32 .npy next to the JSON, which
+    only keeps metadata and the key order of the vector.
+    """
     try:
         path = get_palm_data_path(phone_number)
         
-        # Convert any numpy types to native Python types for JSON serialization
-        def convert_to_native(obj):
-            """Recursively convert numpy types to native Python types"""
-            import numpy as np
-            
-            if isinstance(obj, dict):
-                return {key: convert_to_native(value) for key, value in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_to_native(item) for item in obj]
-            elif isinstance(obj, (np.integer, np.floating)):
-                return obj.item()  # Convert numpy scalar to Python scalar
-            elif isinstance(obj, np.ndarray):
-                return obj.tolist()  # Convert numpy array to Python list
-            else:
-                return obj
+        palm_data = dict(palm_data)
+        normalized_distances = palm_data.pop('normalizedDistances', None)
+        palm_data.pop('rawDistances', None)
+        vector = None
+        if normalized_distances is not None:
+            vector = distances_to_vector(normalized_distances)
+            palm_data['distanceKeys'] = DISTANCE_KEYS
+            template_path = get_palm_template_path(phone_number)
+            tmp_template_path = template_path.with_suffix('.npy.tmp')
+            with open(tmp_template_path, 'wb') as f:
+                np.save(f, vector)
+            os.replace(tmp_template_path, template_path)
         
-        palm_data_native = convert_to_native(palm_data)
+        # Write compact JSON to a temp file and swap it in, so a crash
+        # mid-write never leaves a truncated palm file behind
+        tmp_path = path.with_suffix('.json.tmp')
+        tmp_path.write_bytes(orjson.dumps(palm_data, default=_np_default, option=orjson.OPT_SERIALIZE_NUMPY))
+        os.replace(tmp_path, path)
         
-        with open(path, 'w') as f:
-            json.dump(palm_data_native, f, indent=2)
+        if vector is not None:
+            update_template_index(phone_number, vector)
         print(f"💾 Saved palm data to {path}", file=sys.stderr)
         return True
     except Exception as e:
         print(f"❌ Failed to save palm data: {e}", file=sys.stderr)
-        import traceback
         traceback.print_exc(file=sys.stderr)
         return False
 
@@ -104,19 +339,6 @@ def register_palm(image_path: str, phone_number: str) -> dict:
             "message": f"Image not found: {image_path}"
         }
     
-    # Initialize palm recognition system
-    print("🤖 Initializing palm recognition system...", file=sys.stderr)
-    print(f"📂 Model path: {MODEL_PATH}", file=sys.stderr)
-    print(f"📂 Model exists: {MODEL_PATH.exists()}", file=sys.stderr)
-    system = PalmRecognitionSystem(model_path=str(MODEL_PATH))
-    
-    if system.model is None:
-        print("❌ Palm recognition model not loaded", file=sys.stderr)
-        return {
-            "success": False,
-            "message": "Palm recognition model not available"
-        }
-    
     # Check if palm already registered
     existing_data = load_palm_data(phone_number)
     if existing_data:
@@ -126,6 +348,16 @@ def register_palm(image_path: str, phone_number: str) -> dict:
             "message": "Palm already registered for this phone number. Please delete existing registration first."
         }
     
+    # Initialize palm recognition system (loaded once per process)
+    system = get_system()
+    
+    if system.model is None:
+        print("❌ Palm recognition model not loaded", file=sys.stderr)
+        return {
+            "success": False,
+            "message": "Palm recognition model not available"
+        }
+    
     # Create palm template
     print("🔍 Analyzing palm image...", file=sys.stderr)
     template = system.create_palm_template(image_path)
@@ -142,13 +374,14 @@ def register_palm(image_path: str, phone_number: str) -> dict:
     print(f"   Measurements: {len(template['normalized_distances'])}", file=sys.stderr)
     
     # Create minimal palm data (only what's needed for comparison)
+    now = datetime.now(timezone.utc).isoformat()
     palm_data = {
         "phoneNumber": phone_number,
         "signature": template['signature'],
         "normalizedDistances": template['normalized_distances'],
         "rawDistances": template['raw_distances'],
-        "registeredAt": datetime.utcnow().isoformat(),
-        "lastUsed": datetime.utcnow().isoformat()
+        "registeredAt": now,
+        "lastUsed": now
     }
     
     # Save palm data
@@ -197,11 +430,40 @@ def recognize_palm(image_path: str, phone_number: str = None, threshold: float =
             "message": f"Image not found: {image_path}"
         }
     
-    # Initialize palm recognition system
-    print("🤖 Initializing palm recognition system...", file=sys.stderr)
-    print(f"📂 Model path: {MODEL_PATH}", file=sys.stderr)
-    print(f"📂 Model exists: {MODEL_PATH.exists()}", file=sys.stderr)
-    system = PalmRecognitionSystem(model_path=str(MODEL_PATH))
+    # Load the stored templates first, so nothing is loaded for an empty comparison
+    if phone_number:
+        # Only check specific phone number: its JSON must still exist (a corrupted
+        # one is discarded with its sidecars) before its stored vector is used
+        stored_data = load_palm_data(phone_number)
+        if stored_data is None:
+            print(f"❌ No palm registered for {phone_number}", file=sys.stderr)
+            return {
+                "success": False,
+                "match": False,
+                "message": f"No palm registered for {phone_number}"
+            }
+        try:
+            stored_vector = load_stored_vector(str(get_palm_data_path(phone_number)), stored_data)
+        except (KeyError, ValueError, TypeError, EOFError, OSError) as e:
+            print(f"❌ Stored palm data for {phone_number} is corrupted: {e}", file=sys.stderr)
+            return {
+                "success": False,
+                "match": False,
+                "message": f"Stored palm data for {phone_number} is corrupted. Please register again."
+            }
+    else:
+        # Check all registered palms
+        phones, templates = load_template_index()
+        if len(phones) == 0:
+            print("❌ No registered palms found", file=sys.stderr)
+            return {
+                "success": False,
+                "match": False,
+                "message": "No registered palms in database"
+            }
+    
+    # Initialize palm recognition system (loaded once per process)
+    system = get_system()
     
     if system.model is None:
         print("❌ Palm recognition model not loaded", file=sys.stderr)
@@ -224,75 +486,39 @@ def recognize_palm(image_path: str, phone_number: str = None, threshold: float =
     print(f"✅ Palm template created", file=sys.stderr)
     print(f"   Signature: {template['signature']}", file=sys.stderr)
     
-    # Load palm data to compare against
-    palm_files = []
+    probe = distances_to_vector(template['normalized_distances'])
+    
     if phone_number:
-        # Only check specific phone number
-        palm_file = get_palm_data_path(phone_number)
-        if palm_file.exists():
-            palm_files = [palm_file]
-        else:
-            print(f"❌ No palm registered for {phone_number}", file=sys.stderr)
-            return {
-                "success": False,
-                "match": False,
-                "message": f"No palm registered for {phone_number}"
-            }
+        best_distance = system.calculate_vector_distance(stored_vector, probe)
+        best_phone = phone_number
     else:
-        # Check all registered palms
-        palm_files = list(PALM_DATA_DIR.glob("*.json"))
-    
-    if not palm_files:
-        print("❌ No registered palms found", file=sys.stderr)
-        return {
-            "success": False,
-            "match": False,
-            "message": "No registered palms in database"
-        }
-    
-    print(f"🔍 Comparing against {len(palm_files)} registered palm(s)...", file=sys.stderr)
-    
-    # Compare with registered palms
-    best_match = None
-    best_distance = float('inf')
-    
-    for palm_file in palm_files:
-        try:
-            with open(palm_file, 'r') as f:
-                stored_data = json.load(f)
-            
-            # Calculate distance
-            distance = system.calculate_template_distance(
-                template['normalized_distances'],
-                stored_data['normalizedDistances']
-            )
-            
-            print(f"   📊 {stored_data['phoneNumber']}: distance = {distance:.6f}", file=sys.stderr)
-            
-            if distance < best_distance:
-                best_distance = distance
-                best_match = stored_data
-        except json.JSONDecodeError as e:
-            print(f"⚠️  Skipping corrupted file {palm_file.name}: {e}", file=sys.stderr)
-            continue
+        if templates.shape[1] != len(probe):
+            print("⚠️  Palm template store is inconsistent", file=sys.stderr)
+            phones, templates = rebuild_template_index()
+        
+        print(f"🔍 Comparing against {len(phones)} registered palm(s)...", file=sys.stderr)
+        
+        # Compare with all registered palms in one vectorized pass; probe and
+        # templates are both C-contiguous float32 so NumPy runs packed SIMD loops
+        best_index, best_distance = find_best_template(probe, templates)
+        best_phone = str(phones[best_index])
     
     # Check if match is within threshold
     print(f"🎯 Best match distance: {best_distance:.6f}", file=sys.stderr)
     print(f"🎯 Threshold: {threshold}", file=sys.stderr)
     
-    if best_match and best_distance <= threshold:
-        print(f"✅ Palm recognized as: {best_match['phoneNumber']}", file=sys.stderr)
+    if best_distance <= threshold:
+        print(f"✅ Palm recognized as: {best_phone}", file=sys.stderr)
         
-        # Update last used timestamp
-        best_match['lastUsed'] = datetime.utcnow().isoformat()
-        save_palm_data(best_match['phoneNumber'], best_match)
+        # Update last used timestamp in its sidecar instead of rewriting the palm data
+        get_palm_last_used_path(best_phone).write_text(datetime.now(timezone.utc).isoformat())
         
         return {
             "success": True,
             "match": True,
             "message": "Palm recognized successfully",
             "data": {
-                "phoneNumber": best_match['phoneNumber'],
+                "phoneNumber": best_phone,
                 "distance": best_distance,
                 "confidence": 1 - best_distance,
                 "threshold": threshold
@@ -317,6 +543,8 @@ def delete_palm(phone_number: str) -> dict:
     palm_file = get_palm_data_path(phone_number)
     if palm_file.exists():
         os.remove(palm_file)
+        remove_palm_sidecars(phone_number)
+        update_template_index(phone_number)
         print(f"✅ Palm data deleted for {phone_number}", file=sys.stderr)
         return {
             "success": True,
@@ -333,20 +561,23 @@ def list_registered_palms() -> dict:
     """List all registered palms"""
     print("📋 Listing all registered palms...", file=sys.stderr)
     
-    palm_files = list(PALM_DATA_DIR.glob("*.json"))
-    
     palms = []
-    for palm_file in palm_files:
+    for palm_file in iter_palm_files():
         try:
-            with open(palm_file, 'r') as f:
-                data = json.load(f)
-                palms.append({
-                    "phoneNumber": data['phoneNumber'],
-                    "registeredAt": data['registeredAt'],
-                    "lastUsed": data.get('lastUsed', data['registeredAt'])
-                })
-        except json.JSONDecodeError as e:
-            print(f"⚠️  Skipping corrupted file {palm_file.name}: {e}", file=sys.stderr)
+            with open(palm_file, 'rb') as f:
+                data = orjson.loads(f.read())
+            last_used_path = get_palm_last_used_path(data['phoneNumber'])
+            if last_used_path.exists():
+                last_used = last_used_path.read_text().strip()
+            else:
+                last_used = data.get('lastUsed', data['registeredAt'])
+            palms.append({
+                "phoneNumber": data['phoneNumber'],
+                "registeredAt": data['registeredAt'],
+                "lastUsed": last_used
+            })
+        except orjson.JSONDecodeError as e:
+            print(f"⚠️  Skipping corrupted file {os.path.basename(palm_file)}: {e}", file=sys.stderr)
     
     print(f"✅ Found {len(palms)} registered palm(s)", file=sys.stderr)
     return {
@@ -355,95 +586,132 @@ def list_registered_palms() -> dict:
         "palms": palms
     }
 
+def write_result(result: dict):
+    """Write a result to stdout as one line of compact JSON"""
+    sys.stdout.buffer.write(orjson.dumps(result, default=_np_default, option=orjson.OPT_SERIALIZE_NUMPY) + b'\n')
+    sys.stdout.flush()
+
+def dispatch(command: str, args: list) -> dict:
+    """
+    Run a single API command
+    
+    Args:
+        command: One of register, recognize, delete, list
+        args: Positional arguments for the command; None means "not given"
+        
+    Returns:
+        Result dictionary
+    """
+    def arg(index):
+        return args[index] if len(args) > index else None
+    
+    if command == "register":
+        if arg(0) is None or arg(1) is None:
+            return {
+                "success": False,
+                "message": "Usage: python palm_api.py register <image_path> <phone_number>"
+            }
+        image_path = args[0]
+        phone_number = args[1]
+        return register_palm(image_path, phone_number)
+    
+    elif command == "recognize":
+        if arg(0) is None:
+            return {
+                "success": False,
+                "message": "Usage: python palm_api.py recognize <image_path> [phone_number] [threshold]"
+            }
+        image_path = args[0]
+        phone_number = arg(1)
+        threshold = float(arg(2)) if arg(2) is not None else 0.13
+        return recognize_palm(image_path, phone_number, threshold)
+    
+    elif command == "delete":
+        if arg(0) is None:
+            return {
+                "success": False,
+                "message": "Usage: python palm_api.py delete <phone_number>"
+            }
+        phone_number = args[0]
+        return delete_palm(phone_number)
+    
+    elif command == "list":
+        return list_registered_palms()
+    
+    return {
+        "success": False,
+        "message": f"Unknown command: {command}. Valid commands: register, recognize, delete, list, serve"
+    }
+
+def serve():
+    """
+    Serve requests over stdin/stdout until EOF
+    
+    Each input line is a JSON request {"id": ..., "command": ..., "args": [...]};
+    each output line is the JSON result with the request's id echoed back.
+    The model is loaded once and reused for every request.
+    """
+    print("🚀 Palm API serving on stdin", file=sys.stderr)
+    get_system()
+    
+    for line in sys.stdin.buffer:
+        if not line.strip():
+            continue
+        
+        request_id = None
+        try:
+            request = orjson.loads(line)
+            request_id = request.get('id')
+            command = request.get('command')
+            # Keep argument positions: a null (e.g. an undefined phone number
+            # from the dashboard) means "not given", not "shift the rest left"
+            args = [None if arg is None else str(arg) for arg in request.get('args', [])]
+            print(f"🎯 Command: {command}", file=sys.stderr)
+            print(f"📝 Arguments: {args}", file=sys.stderr)
+            result = dispatch(command, args)
+        except Exception as e:
+            print(f"❌ Error: {e}", file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            result = {
+                "success": False,
+                "message": f"Error: {str(e)}"
+            }
+        
+        result['id'] = request_id
+        write_result(result)
+
 def main():
     """Main function - command line interface"""
     if len(sys.argv) < 2:
-        print(json.dumps({
+        write_result({
             "success": False,
             "message": "Missing command. Usage: python palm_api.py <command> [args...]"
-        }))
+        })
         sys.exit(1)
     
     command = sys.argv[1]
+    if command == "serve":
+        serve()
+        return
+    
+    print("⚠️  One-shot CLI calls reload the model every time; use 'python palm_api.py serve' instead", file=sys.stderr)
     print(f"🎯 Command: {command}", file=sys.stderr)
     print(f"📝 Arguments: {sys.argv[2:]}", file=sys.stderr)
     
     try:
-        result = None
-        
-        if command == "register":
-            if len(sys.argv) < 4:
-                result = {
-                    "success": False,
-                    "message": "Usage: python palm_api.py register <image_path> <phone_number>"
-                }
-            else:
-                image_path = sys.argv[2]
-                phone_number = sys.argv[3]
-                result = register_palm(image_path, phone_number)
-        
-        elif command == "recognize":
-            if len(sys.argv) < 3:
-                result = {
-                    "success": False,
-                    "message": "Usage: python palm_api.py recognize <image_path> [phone_number] [threshold]"
-                }
-            else:
-                image_path = sys.argv[2]
-                phone_number = sys.argv[3] if len(sys.argv) > 3 else None
-                threshold = float(sys.argv[4]) if len(sys.argv) > 4 else 0.13
-                result = recognize_palm(image_path, phone_number, threshold)
-        
-        elif command == "delete":
-            if len(sys.argv) < 3:
-                result = {
-                    "success": False,
-                    "message": "Usage: python palm_api.py delete <phone_number>"
-                }
-            else:
-                phone_number = sys.argv[2]
-                result = delete_palm(phone_number)
-        
-        elif command == "list":
-            result = list_registered_palms()
-        
-        else:
-            result = {
-                "success": False,
-                "message": f"Unknown command: {command}. Valid commands: register, recognize, delete, list"
-            }
-        
-        # Convert to native types before JSON output
-        def convert_to_native(obj):
-            """Recursively convert numpy types to native Python types"""
-            import numpy as np
-            
-            if isinstance(obj, dict):
-                return {key: convert_to_native(value) for key, value in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_to_native(item) for item in obj]
-            elif isinstance(obj, (np.integer, np.floating)):
-                return obj.item()  # Convert numpy scalar to Python scalar
-            elif isinstance(obj, np.ndarray):
-                return obj.tolist()  # Convert numpy array to Python list
-            else:
-                return obj
+        result = dispatch(command, sys.argv[2:])
         
-        result_native = convert_to_native(result)
-        
-        # Output result as JSON to stdout
-        print(json.dumps(result_native, indent=2))
+        # Output result as compact JSON to stdout (orjson handles numpy values directly)
+        write_result(result)
         
     except Exception as e:
         print(f"❌ Error: {e}", file=sys.stderr)
-        import traceback
         traceback.print_exc(file=sys.stderr)
-        print(json.dumps({
+        write_result({
             "success": False,
             "message": f"Error: {str(e)}"
-        }))
+        })
         sys.exit(1)
 
 if __name__ == "__main__":
     main()
-
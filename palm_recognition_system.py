@@ -8,12 +8,94 @@ import numpy as np
 import json
 import hashlib
 from pathlib import Path
+import torch
 from ultralytics import YOLO
 import matplotlib.pyplot as plt
 from typing import Dict, List, Tuple, Optional
 import pickle
 import os
 import sys
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# Below this many templates a linear scan beats building and querying an ANN index
+ANN_MIN_TEMPLATES = 1000
+
+if njit is not None:
+    # The explicit signature compiles the kernel at import time (or loads it
+    # from the on-disk cache), so the first match pays no JIT latency
+    @njit('f4(f4[::1], f4[::1])', fastmath=True, cache=True)
+    def _euclidean_distance(vector1, vector2):
+        """Euclidean distance between two float32 vectors, compiled to a SIMD loop"""
+        total = np.float32(0.0)
+        for i in range(vector1.shape[0]):
+            diff = vector1[i] - vector2[i]
+            total += diff * diff
+        return np.sqrt(total)
+    
+    @njit('i8[::1](i2[::1], i2[:, ::1])', parallel=True, fastmath=True, cache=True)
+    def _template_sqdists(query, matrix):
+        """Squared distances from an int16 query to every int16 template row, without a widened copy of the matrix"""
+        out = np.empty(matrix.shape[0], dtype=np.int64)
+        for i in prange(matrix.shape[0]):
+            total = 0
+            for k in range(matrix.shape[1]):
+                diff = np.int64(matrix[i, k]) - np.int64(query[k])
+                total += diff * diff
+            out[i] = total
+        return out
+else:
+    def _euclidean_distance(vector1, vector2):
+        """Euclidean distance between two float32 vectors"""
+        return np.linalg.norm(vector1 - vector2)
+    
+    def _template_sqdists(query, matrix):
+        """Squared distances from an int16 query to every int16 template row"""
+        diff = matrix.astype(np.int64) - query
+        return np.einsum('ij,ij->i', diff, diff)
+
+# Fixed-point scale for stored normalized distances. They are ratios to the
+# wrist-middle knuckle distance, so int16 covers [-8, 8) at a resolution of
+# about 0.00024, far below any useful match threshold
+DISTANCE_QUANT_SCALE = 4096
+DISTANCE_QUANT_LIMIT = 32767 / DISTANCE_QUANT_SCALE
+
+def quantize_distances(vectors: np.ndarray) -> np.ndarray:
+    """Convert normalized distance vectors to int16 fixed point"""
+    return np.clip(np.rint(np.asarray(vectors, dtype=np.float32) * DISTANCE_QUANT_SCALE), -32768, 32767).astype(np.int16)
+
+# Knuckle landmarks in MediaPipe index order. Every distance vector (the
+# database matrix, palm_api's per-phone .npy files, signatures) lists the
+# pairwise distances in the upper-triangle pair order of this list
+KNUCKLE_NAMES = ['wrist', 'index_knuckle', 'middle_knuckle', 'ring_knuckle', 'pinky_knuckle']
+DISTANCE_KEYS = [
+    f"{min(name1, name2)}_{max(name1, name2)}"
+    for i, name1 in enumerate(KNUCKLE_NAMES) for name2 in KNUCKLE_NAMES[i + 1:]
+]
+
+def distances_to_vector(distances: Dict[str, float]) -> np.ndarray:
+    """
+    Convert a distance dictionary to a float32 vector in DISTANCE_KEYS order
+    
+    Args:
+        distances: Dictionary of (normalized) distances
+        
+    Returns:
+        Distance vector
+    """
+    return np.fromiter((distances[key] for key in DISTANCE_KEYS), dtype=np.float32, count=len(DISTANCE_KEYS))
 
 class PalmRecognitionSystem:
     """
@@ -21,17 +103,29 @@ class PalmRecognitionSystem:
     distances between finger knuckles and create unique palm signatures
     """
     
-    def __init__(self, model_path: str = "./modal_training_results/best.pt"):
+    def __init__(self, model_path: str = "./modal_training_results/best.pt", use_openvino: bool = False):
         """
         Initialize the palm recognition system
         
         Args:
             model_path: Path to the trained YOLO hand keypoint model
+            use_openvino: Run inference through an OpenVINO FP16 export of the
+                model, exporting it next to the weights if needed (opt-in)
         """
         self.model_path = model_path
         self.model = None
+        self.use_openvino = use_openvino
+        self.imgsz = 640  # Inference size the model was trained and exported at
         self.palm_database = {}  # Store palm signatures
-        self.database_file = "palm_database.pkl"
+        self.database_file = "palm_database.npz"
+        self.legacy_database_file = "palm_database.pkl"
+        self.ann_index_file = "palm_database.hnsw"
+        
+        # In-memory matrix of all normalized distance vectors (one row per
+        # template, columns in _pair_keys order, int16 fixed point) for vectorized matching
+        self._db_matrix = np.empty((0, 0), dtype=np.int16)
+        self._db_signatures = []
+        self._ann = None  # hnswlib index over the same rows, for large databases
         
         # MediaPipe hand landmark indices for knuckles
         self.knuckle_indices = {
@@ -42,6 +136,17 @@ class PalmRecognitionSystem:
             'pinky_knuckle': 17    # Base of pinky finger
         }
         
+        # Knuckle indices as an array, and the upper-triangle pairs of it with
+        # their distance keys, for computing all pairwise distances at once
+        knuckle_names = list(self.knuckle_indices.keys())
+        assert knuckle_names == KNUCKLE_NAMES
+        self._knuckle_idx_array = np.array(list(self.knuckle_indices.values()))
+        self._knuckle_idx_tensor = None  # Same indices on the inference device
+        self._pair_rows, self._pair_cols = np.triu_indices(len(knuckle_names), 1)
+        self._pair_keys = DISTANCE_KEYS
+        # Column of the wrist-to-middle-knuckle reference distance used for normalization
+        self._reference_idx = self._pair_keys.index("middle_knuckle_wrist")
+        
         # Load the trained model
         self.load_model()
         
@@ -52,6 +157,12 @@ class PalmRecognitionSystem:
         """Load the trained YOLO model"""
         try:
             if os.path.exists(self.model_path):
+                if self.use_openvino:
+                    self.model = self.load_openvino_model()
+                    if self.model is not None:
+                        return
+                    print("⚠️  Falling back to the PyTorch weights", file=sys.stderr)
+                
                 # Load model with verbose=False to suppress YOLO output
                 self.model = YOLO(self.model_path, verbose=False)
                 print(f"✅ Model loaded successfully from {self.model_path}", file=sys.stderr)
@@ -63,38 +174,162 @@ class PalmRecognitionSystem:
             print(f"❌ Failed to load model: {e}", file=sys.stderr)
             self.model = None
     
+    def load_openvino_model(self):
+        """
+        Load the OpenVINO FP16 export of the model, exporting it once if needed
+        
+        Returns:
+            YOLO model backed by OpenVINO, or None to fall back to the .pt weights
+        """
+        openvino_dir = os.path.splitext(self.model_path)[0] + "_openvino_model"
+        try:
+            if not os.path.isdir(openvino_dir) or os.path.getmtime(openvino_dir) < os.path.getmtime(self.model_path):
+                print("⚙️  Exporting model to OpenVINO FP16 (one time)...", file=sys.stderr)
+                openvino_dir = YOLO(self.model_path, verbose=False).export(format='openvino', half=True, dynamic=False, imgsz=640)
+            
+            model = YOLO(openvino_dir, task='pose', verbose=False)
+            print(f"✅ OpenVINO model loaded successfully from {openvino_dir}", file=sys.stderr)
+            return model
+        except Exception as e:
+            print(f"⚠️  OpenVINO model unavailable: {e}", file=sys.stderr)
+            return None
+    
     def load_database(self):
         """Load existing palm database from file"""
         try:
             if os.path.exists(self.database_file):
-                with open(self.database_file, 'rb') as f:
-                    self.palm_database = pickle.load(f)
+                with np.load(self.database_file) as data:
+                    self._db_matrix = data['matrix']
+                    if self._db_matrix.dtype != np.int16:
+                        self._db_matrix = quantize_distances(self._db_matrix)
+                    raw_matrix = data['raw_matrix']
+                    self._db_signatures = data['signatures'].tolist()
+                    metadata = json.loads(str(data['metadata']))
+                
+                self.palm_database = {}
+                for signature, normalized, raw, extras in zip(self._db_signatures, self._db_matrix, raw_matrix, metadata):
+                    self.palm_database[signature] = dict(
+                        extras,
+                        signature=signature,
+                        normalized_distances=dict(zip(self._pair_keys, normalized.astype(np.float32) / DISTANCE_QUANT_SCALE)),
+                        raw_distances=dict(zip(self._pair_keys, raw))
+                    )
+                self._load_ann_index()
                 print(f"✅ Loaded {len(self.palm_database)} palm signatures from database", file=sys.stderr)
+            elif os.path.exists(self.legacy_database_file):
+                # One-time migration from the old pickled database
+                with open(self.legacy_database_file, 'rb') as f:
+                    self.palm_database = pickle.load(f)
+                self._rebuild_db_matrix()
+                print(f"✅ Loaded {len(self.palm_database)} palm signatures from {self.legacy_database_file}", file=sys.stderr)
+                self.save_database()
             else:
                 print("📝 Creating new palm database", file=sys.stderr)
                 self.palm_database = {}
         except Exception as e:
             print(f"❌ Failed to load database: {e}", file=sys.stderr)
             self.palm_database = {}
+            self._rebuild_db_matrix()
+    
+    def _rebuild_db_matrix(self):
+        """Rebuild the in-memory template matrix from the palm database"""
+        self._db_signatures = list(self.palm_database.keys())
+        self._db_matrix = quantize_distances(np.array(
+            [self.distances_to_vector(template['normalized_distances']) for template in self.palm_database.values()],
+            dtype=np.float32
+        ).reshape(len(self._db_signatures), len(self._pair_keys)))
+        self._sync_ann_index()
+    
+    def _load_ann_index(self):
+        """Load the saved ANN index if it matches the database, otherwise build it"""
+        count = len(self._db_signatures)
+        if hnswlib is not None and count >= ANN_MIN_TEMPLATES and os.path.exists(self.ann_index_file):
+            try:
+                index = hnswlib.Index(space='l2', dim=len(self._pair_keys))
+                index.load_index(self.ann_index_file, max_elements=count)
+                if index.get_current_count() == count:
+                    index.set_ef(50)
+                    self._ann = index
+                    return
+            except Exception as e:
+                print(f"⚠️  Failed to load ANN index, rebuilding: {e}", file=sys.stderr)
+        
+        self._ann = None
+        self._sync_ann_index()
+    
+    def _sync_ann_index(self):
+        """Bring the ANN index up to date with the template matrix (rows are only ever appended)"""
+        count = len(self._db_signatures)
+        if hnswlib is None or count < ANN_MIN_TEMPLATES:
+            self._ann = None
+            return
+        
+        if self._ann is None or self._ann.get_current_count() > count:
+            self._ann = hnswlib.Index(space='l2', dim=len(self._pair_keys))
+            self._ann.init_index(max_elements=count, M=16, ef_construction=200)
+            self._ann.set_ef(50)
+        
+        start = self._ann.get_current_count()
+        if start < count:
+            if self._ann.get_max_elements() < count:
+                self._ann.resize_index(max(count, 2 * self._ann.get_max_elements()))
+            rows = self._db_matrix[start:].astype(np.float32) / DISTANCE_QUANT_SCALE
+            self._ann.add_items(rows, np.arange(start, count))
+    
+    def distances_to_vector(self, distances: Dict[str, float]) -> np.ndarray:
+        """Convert a distance dictionary to a float32 vector in _pair_keys (DISTANCE_KEYS) order"""
+        return distances_to_vector(distances)
     
     def save_database(self):
-        """Save palm database to file"""
+        """
+        Save palm database to file
+        
+        Distance vectors are stored as float32 matrices in _pair_keys order;
+        the remaining template fields are stored as one JSON document.
+        """
         try:
-            with open(self.database_file, 'wb') as f:
-                pickle.dump(self.palm_database, f)
+            templates = list(self.palm_database.values())
+            raw_matrix = np.array(
+                [self.distances_to_vector(template['raw_distances']) for template in templates],
+                dtype=np.float32
+            ).reshape(len(templates), len(self._pair_keys))
+            metadata = [
+                {key: value for key, value in template.items()
+                 if key not in ('signature', 'normalized_distances', 'raw_distances')}
+                for template in templates
+            ]
+            
+            # Write to a temp file and swap it in, so a crash mid-write never
+            # leaves a truncated database behind
+            tmp_path = self.database_file + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    matrix=self._db_matrix,
+                    raw_matrix=raw_matrix,
+                    signatures=np.array(self._db_signatures, dtype=str),
+                    metadata=np.array(json.dumps(metadata))
+                )
+            os.replace(tmp_path, self.database_file)
+            if self._ann is not None:
+                tmp_index_path = self.ann_index_file + '.tmp'
+                self._ann.save_index(tmp_index_path)
+                os.replace(tmp_index_path, self.ann_index_file)
             print(f"💾 Saved {len(self.palm_database)} palm signatures to database", file=sys.stderr)
         except Exception as e:
             print(f"❌ Failed to save database: {e}", file=sys.stderr)
     
-    def detect_hand_keypoints(self, image_path: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    def detect_hand_keypoints(self, image_path: str, return_image: bool = False) -> Optional[Tuple[np.ndarray, ...]]:
         """
         Detect hand keypoints in an image
         
         Args:
             image_path: Path to the input image
+            return_image: Also return the decoded BGR image, for callers that draw on it
             
         Returns:
-            Tuple of (keypoints, confidences) or None if detection fails
+            Tuple of (keypoints, confidences), or (keypoints, confidences, image)
+            with return_image, or None if detection fails
         """
         if self.model is None:
             print("❌ Model not loaded", file=sys.stderr)
@@ -102,42 +337,123 @@ class PalmRecognitionSystem:
         
         try:
             # Load image
-            image = cv2.imread(str(image_path))
+            image = self._load_bgr(image_path)
             if image is None:
                 print(f"❌ Could not load image: {image_path}", file=sys.stderr)
                 return None
             
             # Run inference with verbose=False to suppress output
-            results = self.model(image, verbose=False)
+            resized, scale = self._resize_for_inference(image)
+            results = self.model(resized, imgsz=self.imgsz, verbose=False)
             
             if len(results) == 0:
                 print("❌ No results returned", file=sys.stderr)
                 return None
             
-            result = results[0]
+            detection = self._extract_keypoints(results[0], scale)
+            if detection is not None and return_image:
+                return detection + (image,)
+            return detection
             
-            # Check if keypoints were detected
-            if result.keypoints is None or len(result.keypoints) == 0:
-                print("❌ No hand keypoints detected", file=sys.stderr)
-                return None
-            
-            keypoints = result.keypoints.xy[0].cpu().numpy()  # Shape: (21, 2)
-            confidences = result.keypoints.conf[0].cpu().numpy()  # Shape: (21,)
-            
-            # Check if knuckle keypoints have sufficient confidence
-            knuckle_confidences = [confidences[idx] for idx in self.knuckle_indices.values()]
-            min_confidence = 0.5
-            
-            if min(knuckle_confidences) < min_confidence:
-                print(f"❌ Low confidence in knuckle detection (min: {min(knuckle_confidences):.3f})", file=sys.stderr)
-                return None
-            
-            print(f"✅ Detected {len(keypoints)} keypoints with avg confidence: {np.mean(confidences):.3f}", file=sys.stderr)
-            return keypoints, confidences
+        except Exception as e:
+            print(f"❌ Keypoint detection failed: {e}", file=sys.stderr)
+            return None
+    
+    def detect_hand_keypoints_batch(self, image_paths: List[str], return_image: bool = False) -> List[Optional[Tuple[np.ndarray, ...]]]:
+        """
+        Detect hand keypoints in several images with one batched inference call
+        
+        Args:
+            image_paths: Paths to the input images
+            return_image: Also return each decoded BGR image, so callers can
+                visualize without decoding again
             
+        Returns:
+            List of (keypoints, confidences), plus the image with return_image,
+            or None per image, in input order
+        """
+        if self.model is None:
+            print("❌ Model not loaded", file=sys.stderr)
+            return [None] * len(image_paths)
+        
+        # cv2 releases the GIL while decoding, so read the images in parallel
+        with ThreadPoolExecutor(max_workers=min(8, len(image_paths) or 1)) as executor:
+            images = list(executor.map(self._load_bgr, image_paths))
+        
+        detections = [None] * len(image_paths)
+        loaded = []
+        for i, image in enumerate(images):
+            if image is None:
+                print(f"❌ Could not load image: {image_paths[i]}", file=sys.stderr)
+            else:
+                loaded.append(i)
+        
+        for i, detection in zip(loaded, self._detect_images([images[i] for i in loaded])):
+            if detection is not None and return_image:
+                detection = detection + (images[i],)
+            detections[i] = detection
+        
+        return detections
+    
+    def _detect_images(self, images: List[np.ndarray]) -> List[Optional[Tuple[np.ndarray, np.ndarray]]]:
+        """Run one batched inference over decoded BGR images"""
+        if not images:
+            return []
+        
+        try:
+            resized, scales = zip(*(self._resize_for_inference(image) for image in images))
+            results = self.model(list(resized), imgsz=self.imgsz, verbose=False)
+            return [self._extract_keypoints(result, scale) for result, scale in zip(results, scales)]
         except Exception as e:
             print(f"❌ Keypoint detection failed: {e}", file=sys.stderr)
+            return [None] * len(images)
+    
+    def _load_bgr(self, image_path: str) -> Optional[np.ndarray]:
+        """Read an image as a BGR array, or None if it can't be read"""
+        return cv2.imread(str(image_path))
+    
+    def _resize_for_inference(self, image: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Downscale an image so its longest side matches the inference size
+        
+        Returns:
+            (resized image, scale factor applied)
+        """
+        height, width = image.shape[:2]
+        scale = self.imgsz / max(height, width)
+        if scale >= 1.0:
+            return image, 1.0
+        resized = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_LINEAR)
+        return resized, scale
+    
+    def _extract_keypoints(self, result, scale: float = 1.0) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Pull the first hand's keypoints out of a YOLO result, checking knuckle confidence"""
+        # Check if keypoints were detected
+        if result.keypoints is None or len(result.keypoints) == 0:
+            print("❌ No hand keypoints detected", file=sys.stderr)
+            return None
+        
+        # Check if knuckle keypoints have sufficient confidence while the
+        # tensors are still on the inference device, so rejected frames
+        # never copy keypoints back to the host
+        confidences_t = result.keypoints.conf[0]  # Shape: (21,)
+        if self._knuckle_idx_tensor is None or self._knuckle_idx_tensor.device != confidences_t.device:
+            self._knuckle_idx_tensor = torch.as_tensor(self._knuckle_idx_array, device=confidences_t.device)
+        knuckle_min_confidence = float(confidences_t[self._knuckle_idx_tensor].min())
+        min_confidence = 0.5
+        
+        if knuckle_min_confidence < min_confidence:
+            print(f"❌ Low confidence in knuckle detection (min: {knuckle_min_confidence:.3f})", file=sys.stderr)
             return None
+        
+        keypoints = result.keypoints.xy[0].cpu().numpy()  # Shape: (21, 2)
+        confidences = confidences_t.cpu().numpy()  # Shape: (21,)
+        if scale != 1.0:
+            # Map back to the original image's pixel coordinates
+            keypoints = keypoints / np.float32(scale)
+        
+        print(f"✅ Detected {len(keypoints)} keypoints with avg confidence: {np.mean(confidences):.3f}", file=sys.stderr)
+        return keypoints, confidences
     
     def calculate_knuckle_distances(self, keypoints: np.ndarray) -> Dict[str, float]:
         """
@@ -149,29 +465,18 @@ class PalmRecognitionSystem:
         Returns:
             Dictionary of distance measurements
         """
-        distances = {}
+        # Pin to float32 so float64 inputs (e.g. keypoints loaded from JSON) don't
+        # promote every intermediate below and the distance vectors stay float32
+        keypoints = np.ascontiguousarray(keypoints, dtype=np.float32)
         
         # Get knuckle coordinates
-        knuckle_coords = {}
-        for name, idx in self.knuckle_indices.items():
-            knuckle_coords[name] = keypoints[idx]
+        knuckle_coords = keypoints[self._knuckle_idx_array]
         
-        # Calculate all pairwise distances between knuckles
-        knuckle_names = list(knuckle_coords.keys())
-        
-        for i, name1 in enumerate(knuckle_names):
-            for j, name2 in enumerate(knuckle_names[i+1:], i+1):
-                coord1 = knuckle_coords[name1]
-                coord2 = knuckle_coords[name2]
-                
-                # Calculate Euclidean distance
-                distance = np.sqrt(np.sum((coord1 - coord2) ** 2))
-                
-                # Create a consistent key name (alphabetically sorted)
-                key = f"{min(name1, name2)}_{max(name1, name2)}"
-                distances[key] = distance
+        # Calculate all pairwise distances between knuckles in one broadcast
+        diff = knuckle_coords[:, None, :] - knuckle_coords[None, :, :]
+        pairwise = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
         
-        return distances
+        return dict(zip(self._pair_keys, pairwise[self._pair_rows, self._pair_cols]))
     
     def normalize_distances(self, distances: Dict[str, float]) -> Dict[str, float]:
         """
@@ -183,6 +488,15 @@ class PalmRecognitionSystem:
         Returns:
             Dictionary of normalized distances
         """
+        # Full knuckle sets (the normal case) are divided as one float32 vector
+        if len(distances) == len(self._pair_keys):
+            try:
+                vector = self.distances_to_vector(distances)
+            except KeyError:
+                pass
+            else:
+                return dict(zip(self._pair_keys, vector / vector[self._reference_idx]))
+        
         # Use wrist-to-middle_knuckle as reference distance for normalization
         reference_key = "middle_knuckle_wrist"
         if reference_key not in distances:
@@ -201,12 +515,35 @@ class PalmRecognitionSystem:
         """
         Generate a unique signature from knuckle distances
         
+        The signature hashes the rounded distances, so two palms share it only
+        when every distance matches to 6 decimals; nearby palms get unrelated
+        signatures. Matching therefore has to compare the distance vectors.
+        
         Args:
             distances: Dictionary of normalized distances
             
         Returns:
             Unique signature string
         """
+        # Hash the float32 vector in the fixed _pair_keys order, rounded to 6
+        # decimals so the signature is stable across rebuilds; no sorting or
+        # text formatting needed
+        rounded = np.round(self.distances_to_vector(distances), 6)
+        
+        # blake2b with an 8-byte digest gives the same 16 hex characters as
+        # the old truncated SHA-256, with less per-call overhead
+        return hashlib.blake2b(rounded.tobytes(), digest_size=8).hexdigest()
+    
+    def generate_legacy_palm_signature(self, distances: Dict[str, float]) -> str:
+        """
+        Generate the SHA-256 based signature used by databases created before blake2b
+        
+        Args:
+            distances: Dictionary of normalized distances
+            
+        Returns:
+            Legacy signature string
+        """
         # Sort distances by key for consistency
         sorted_distances = sorted(distances.items())
         
@@ -214,17 +551,18 @@ class PalmRecognitionSystem:
         distance_string = "|".join([f"{key}:{value:.6f}" for key, value in sorted_distances])
         
         # Generate hash
-        signature = hashlib.sha256(distance_string.encode()).hexdigest()[:16]
-        
-        return signature
+        return hashlib.sha256(distance_string.encode()).hexdigest()[:16]
     
-    def create_palm_template(self, image_path: str, person_name: str = None) -> Optional[Dict]:
+    def create_palm_template(self, image_path: str, person_name: str = None,
+                             detection: Optional[Tuple[np.ndarray, ...]] = None) -> Optional[Dict]:
         """
         Create a palm template from an image
         
         Args:
             image_path: Path to the palm image
             person_name: Name/ID of the person (optional)
+            detection: (keypoints, confidences[, image]) already detected for
+                this image, e.g. by detect_hand_keypoints_batch (optional)
             
         Returns:
             Palm template dictionary or None if failed
@@ -232,11 +570,11 @@ class PalmRecognitionSystem:
         print(f"🔍 Creating palm template from: {image_path}", file=sys.stderr)
         
         # Detect keypoints
-        result = self.detect_hand_keypoints(image_path)
+        result = detection if detection is not None else self.detect_hand_keypoints(image_path)
         if result is None:
             return None
         
-        keypoints, confidences = result
+        keypoints, confidences = result[:2]
         
         # Calculate distances
         raw_distances = self.calculate_knuckle_distances(keypoints)
@@ -263,40 +601,135 @@ class PalmRecognitionSystem:
         
         return template
     
-    def register_palm(self, image_path: str, person_name: str) -> bool:
+    def register_palm(self, image_path: str, person_name: str,
+                      detection: Optional[Tuple[np.ndarray, ...]] = None) -> bool:
         """
         Register a new palm in the database
         
         Args:
             image_path: Path to the palm image
             person_name: Name/ID of the person
+            detection: Keypoints already detected for this image (optional)
             
         Returns:
             True if registration successful, False otherwise
         """
-        template = self.create_palm_template(image_path, person_name)
+        template = self.create_palm_template(image_path, person_name, detection=detection)
         if template is None:
             return False
         
-        # Check if signature already exists
-        if template['signature'] in self.palm_database:
-            print(f"⚠️  Palm signature already exists for: {self.palm_database[template['signature']]['person_name']}", file=sys.stderr)
+        if not self._add_template(template):
             return False
         
-        # Add to database
-        self.palm_database[template['signature']] = template
+        self._rebuild_db_matrix()
         self.save_database()
         
         print(f"✅ Registered palm for: {person_name}", file=sys.stderr)
         return True
     
-    def recognize_palm(self, image_path: str, threshold: float = 0.1) -> Optional[Dict]:
+    def register_many(self, paths_names: List[Tuple[str, str]], batch_size: int = 8) -> int:
+        """
+        Register many palms, decoding images in the background while the model runs
+        
+        Args:
+            paths_names: (image_path, person_name) pairs
+            batch_size: Number of images per inference call
+            
+        Returns:
+            Number of palms registered
+        """
+        if self.model is None:
+            print("❌ Model not loaded", file=sys.stderr)
+            return 0
+        
+        # Bounded queue of decoded images: the decoders stall when inference falls behind
+        decoded = queue.Queue(maxsize=batch_size)
+        
+        def decode_all():
+            # cv2 releases the GIL while decoding, so a small pool keeps ahead of the GPU.
+            # A failure is handed to the consumer, and the end marker is always
+            # sent so the consumer never waits forever
+            try:
+                with ThreadPoolExecutor(max_workers=4) as executor:
+                    pending = deque()
+                    for image_path, person_name in paths_names:
+                        pending.append((executor.submit(self._load_bgr, image_path), image_path, person_name))
+                        if len(pending) >= batch_size:
+                            future, path, name = pending.popleft()
+                            decoded.put((future.result(), path, name))
+                    while pending:
+                        future, path, name = pending.popleft()
+                        decoded.put((future.result(), path, name))
+            except Exception as e:
+                decoded.put(e)
+            finally:
+                decoded.put(None)
+        
+        decoder = threading.Thread(target=decode_all, daemon=True)
+        decoder.start()
+        
+        registered = 0
+        decode_error = None
+        finished = False
+        while not finished:
+            # Collect the next batch of decoded images
+            batch = []
+            while len(batch) < batch_size:
+                item = decoded.get()
+                if item is None:
+                    finished = True
+                    break
+                if isinstance(item, Exception):
+                    decode_error = item
+                    continue
+                image, path, name = item
+                if image is None:
+                    print(f"❌ Could not load image: {path}", file=sys.stderr)
+                    continue
+                batch.append(item)
+            
+            detections = self._detect_images([image for image, _, _ in batch])
+            for (_, path, name), detection in zip(batch, detections):
+                if detection is None:
+                    continue
+                template = self.create_palm_template(path, name, detection=detection)
+                if template is not None and self._add_template(template):
+                    print(f"✅ Registered palm for: {name}", file=sys.stderr)
+                    registered += 1
+        
+        decoder.join()
+        
+        if registered:
+            self._rebuild_db_matrix()
+            self.save_database()
+        
+        # Palms registered before the failure are saved above
+        if decode_error is not None:
+            raise decode_error
+        
+        return registered
+    
+    def _add_template(self, template: Dict) -> bool:
+        """Add a template to the in-memory database unless its signature is already registered"""
+        # Check if signature already exists (entries from older databases use the legacy signature)
+        for signature in (template['signature'], self.generate_legacy_palm_signature(template['normalized_distances'])):
+            if signature in self.palm_database:
+                print(f"⚠️  Palm signature already exists for: {self.palm_database[signature]['person_name']}", file=sys.stderr)
+                return False
+        
+        # Add to database
+        self.palm_database[template['signature']] = template
+        return True
+    
+    def recognize_palm(self, image_path: str, threshold: float = 0.1,
+                       detection: Optional[Tuple[np.ndarray, ...]] = None) -> Optional[Dict]:
         """
         Recognize a palm from an image
         
         Args:
             image_path: Path to the palm image
             threshold: Distance threshold for matching (lower = stricter)
+            detection: Keypoints already detected for this image (optional)
             
         Returns:
             Match information or None if no match found
@@ -304,24 +737,31 @@ class PalmRecognitionSystem:
         print(f"🔍 Recognizing palm from: {image_path}", file=sys.stderr)
         
         # Create template from input image
-        template = self.create_palm_template(image_path)
+        template = self.create_palm_template(image_path, detection=detection)
         if template is None:
             return None
         
-        # Compare with database
+        # Compare with the whole database in one vectorized pass
         best_match = None
         best_distance = float('inf')
         
-        for signature, stored_template in self.palm_database.items():
-            # Calculate distance between normalized distance vectors
-            distance = self.calculate_template_distance(
-                template['normalized_distances'],
-                stored_template['normalized_distances']
-            )
-            
-            if distance < best_distance:
-                best_distance = distance
-                best_match = stored_template
+        query_vector = self.distances_to_vector(template['normalized_distances'])
+        if np.abs(query_vector).max() >= DISTANCE_QUANT_LIMIT:
+            # Would be clipped by quantization and could falsely match other clipped templates
+            print("⚠️  Palm proportions out of range, not matching", file=sys.stderr)
+        elif self._ann is not None:
+            # Approximate nearest neighbour search for large databases (hnswlib returns squared L2)
+            labels, squared = self._ann.knn_query(query_vector[None, :], k=1)
+            best_index = int(labels[0][0])
+            best_distance = float(np.sqrt(squared[0][0]))
+            best_match = self.palm_database[self._db_signatures[best_index]]
+        elif self._db_signatures:
+            # Integer squared distances on the int16 matrix; only the best one
+            # is converted back to the floating-point scale of the threshold
+            squared = _template_sqdists(quantize_distances(query_vector), self._db_matrix)
+            best_index = int(squared.argmin())
+            best_distance = float(np.sqrt(squared[best_index])) / DISTANCE_QUANT_SCALE
+            best_match = self.palm_database[self._db_signatures[best_index]]
         
         # Check if match is within threshold
         if best_match and best_distance <= threshold:
@@ -358,54 +798,103 @@ class PalmRecognitionSystem:
         Returns:
             Euclidean distance between the templates
         """
-        # Ensure both templates have the same keys
-        common_keys = set(distances1.keys()) & set(distances2.keys())
+        # Every template has the same fixed pair keys, so read both straight
+        # into vectors without intersecting key sets
+        try:
+            return self.calculate_vector_distance(
+                self.distances_to_vector(distances1),
+                self.distances_to_vector(distances2)
+            )
+        except KeyError:
+            pass
+        
+        # Partial templates: compare only the keys both have
+        common_keys = sorted(set(distances1.keys()) & set(distances2.keys()))
         
         if len(common_keys) == 0:
             return float('inf')
         
         # Calculate Euclidean distance
-        distance = 0.0
-        for key in common_keys:
-            diff = distances1[key] - distances2[key]
-            distance += diff ** 2
+        vector1 = np.fromiter((distances1[key] for key in common_keys), dtype=np.float32, count=len(common_keys))
+        vector2 = np.fromiter((distances2[key] for key in common_keys), dtype=np.float32, count=len(common_keys))
+        return self.calculate_vector_distance(vector1, vector2)
+    
+    def calculate_vector_distance(self, vector1: np.ndarray, vector2: np.ndarray) -> float:
+        """
+        Calculate distance between two palm templates stored as vectors
         
-        return np.sqrt(distance)
+        Args:
+            vector1: First template's distances, in DISTANCE_KEYS order
+            vector2: Second template's distances, in the same order
+            
+        Returns:
+            Euclidean distance between the templates
+        """
+        vector1 = np.ascontiguousarray(vector1, dtype=np.float32)
+        vector2 = np.ascontiguousarray(vector2, dtype=np.float32)
+        # The compiled kernel indexes both vectors by the first one's length
+        if vector1.shape != vector2.shape:
+            raise ValueError(f"Template shapes differ: {vector1.shape} vs {vector2.shape}")
+        return float(_euclidean_distance(vector1, vector2))
     
-    def visualize_palm_analysis(self, image_path: str, save_path: str = None) -> np.ndarray:
+    def visualize_palm_analysis(self, image_path: str, save_path: str = None, max_vis_dim: int = 1024,
+                                draw_all_points: bool = True, draw_labels: bool = False,
+                                draw_distance_lines: bool = False,
+                                detection: Optional[Tuple[np.ndarray, ...]] = None) -> np.ndarray:
         """
         Visualize palm analysis with knuckle points and distances
         
+        Text rendering is the slow part, so by default only the keypoint
+        markers are drawn; enable the labels and distance lines for the full
+        debug view.
+        
         Args:
             image_path: Path to the input image
             save_path: Path to save the visualization (optional)
+            max_vis_dim: Downscale the visualization so its longest side is at most this
+            draw_all_points: Draw all 21 keypoints, not just the knuckles
+            draw_labels: Draw keypoint indices, knuckle names and distance values
+            draw_distance_lines: Draw lines between every pair of knuckles
+            detection: (keypoints, confidences, image) from
+                detect_hand_keypoints_batch(return_image=True), to skip inference
             
         Returns:
             Visualization image
         """
-        # Detect keypoints
-        result = self.detect_hand_keypoints(image_path)
+        # Detect keypoints, keeping the decoded image for drawing
+        result = detection if detection is not None else self.detect_hand_keypoints(image_path, return_image=True)
         if result is None:
             return None
         
-        keypoints, confidences = result
+        keypoints, confidences, image = result
+        
+        # Downscale large captures before any per-pixel work (including the
+        # color conversion), and scale the keypoints to match
+        height, width = image.shape[:2]
+        if max(height, width) > max_vis_dim:
+            scale = max_vis_dim / max(height, width)
+            image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+            keypoints = keypoints * scale
         
-        # Load image
-        image = cv2.imread(str(image_path))
         image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         
         # Create visualization
         vis_image = image_rgb.copy()
         
+        # Integer pixel coordinates for drawing, converted once
+        kp_int = keypoints.astype(np.int32)
+        
         # Draw all keypoints
-        for i, (kp, conf) in enumerate(zip(keypoints, confidences)):
-            if conf > 0.5:
-                point = tuple(kp.astype(int))
-                color = (255, 0, 0) if i in self.knuckle_indices.values() else (0, 255, 0)
+        if draw_all_points:
+            knuckle_idx_set = set(self.knuckle_indices.values())
+            for i in np.flatnonzero(confidences > 0.5):
+                point = tuple(kp_int[i].tolist())
+                color = (255, 0, 0) if i in knuckle_idx_set else (0, 255, 0)
                 cv2.circle(vis_image, point, 6, color, -1)
                 cv2.circle(vis_image, point, 8, (255, 255, 255), 2)
-                cv2.putText(vis_image, str(i), (point[0] + 10, point[1] - 10), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+                if draw_labels:
+                    cv2.putText(vis_image, str(i), (point[0] + 10, point[1] - 10), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
         
         # Highlight knuckle points
         knuckle_colors = {
@@ -418,33 +907,32 @@ class PalmRecognitionSystem:
         
         for name, idx in self.knuckle_indices.items():
             if confidences[idx] > 0.5:
-                point = tuple(keypoints[idx].astype(int))
+                point = tuple(kp_int[idx].tolist())
                 color = knuckle_colors[name]
                 cv2.circle(vis_image, point, 10, color, -1)
                 cv2.circle(vis_image, point, 12, (255, 255, 255), 2)
-                cv2.putText(vis_image, name.replace('_', ' ').title(), 
-                           (point[0] + 15, point[1] - 15), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-        
-        # Draw distance lines between knuckles
-        knuckle_coords = {name: keypoints[idx] for name, idx in self.knuckle_indices.items()}
-        knuckle_names = list(knuckle_coords.keys())
-        
-        for i, name1 in enumerate(knuckle_names):
-            for j, name2 in enumerate(knuckle_names[i+1:], i+1):
-                coord1 = knuckle_coords[name1]
-                coord2 = knuckle_coords[name2]
-                
-                pt1 = tuple(coord1.astype(int))
-                pt2 = tuple(coord2.astype(int))
+                if draw_labels:
+                    cv2.putText(vis_image, name.replace('_', ' ').title(), 
+                               (point[0] + 15, point[1] - 15), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+        
+        # Draw distance lines between knuckles, with all distances computed at once
+        if draw_distance_lines:
+            knuckle_coords = keypoints[self._knuckle_idx_array]
+            knuckle_int = kp_int[self._knuckle_idx_array]
+            pair_distances = np.linalg.norm(knuckle_coords[self._pair_rows] - knuckle_coords[self._pair_cols], axis=1)
+            
+            for i, j, distance in zip(self._pair_rows, self._pair_cols, pair_distances):
+                pt1 = tuple(knuckle_int[i].tolist())
+                pt2 = tuple(knuckle_int[j].tolist())
                 
                 cv2.line(vis_image, pt1, pt2, (128, 128, 128), 2)
                 
                 # Add distance label
-                mid_point = ((pt1[0] + pt2[0]) // 2, (pt1[1] + pt2[1]) // 2)
-                distance = np.sqrt(np.sum((coord1 - coord2) ** 2))
-                cv2.putText(vis_image, f"{distance:.1f}", mid_point, 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, (128, 128, 128), 1)
+                if draw_labels:
+                    mid_point = ((pt1[0] + pt2[0]) // 2, (pt1[1] + pt2[1]) // 2)
+                    cv2.putText(vis_image, f"{distance:.1f}", mid_point, 
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.4, (128, 128, 128), 1)
         
         # Save if requested
         if save_path:
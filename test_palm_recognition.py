@@ -5,6 +5,25 @@ import numpy as np
 from palm_recognition_system import PalmRecognitionSystem
 from pathlib import Path
 import os
+from itertools import islice
+import queue
+import threading
+
+def iter_jpgs(dir_path, limit=None):
+    """
+    Yield the .jpg files in a directory, in directory order
+    
+    Args:
+        dir_path: Directory to scan (a missing directory yields nothing)
+        limit: Stop after this many files (optional)
+    """
+    if not os.path.isdir(dir_path):
+        return
+    
+    # scandir with a suffix check avoids pathlib's fnmatch-based glob
+    with os.scandir(dir_path) as entries:
+        jpgs = (Path(entry.path) for entry in entries if entry.name.endswith('.jpg') and entry.is_file())
+        yield from islice(jpgs, limit)
 
 def capture_palm_image(camera_index=0, save_path="my_palm.jpg"):
     """
@@ -24,9 +43,35 @@ def capture_palm_image(camera_index=0, save_path="my_palm.jpg"):
         print("❌ Could not open camera")
         return None
     
+    # Keep only the newest frame so SPACE captures the current pose, and ask
+    # for 640x480 MJPG to cut USB bandwidth (drivers ignore what they can't do)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    
+    # Read frames on a background thread; the queue only ever holds the
+    # newest frame, and None signals a failed read
+    frame_queue = queue.Queue(maxsize=1)
+    stop = threading.Event()
+    
+    def grab_frames():
+        while not stop.is_set():
+            ret, frame = cap.read()
+            try:
+                frame_queue.get_nowait()
+            except queue.Empty:
+                pass
+            frame_queue.put(frame if ret else None)
+            if not ret:
+                break
+    
+    grabber = threading.Thread(target=grab_frames, daemon=True)
+    grabber.start()
+    
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        frame = frame_queue.get()
+        if frame is None:
             print("❌ Failed to read from camera")
             break
         
@@ -51,6 +96,8 @@ def capture_palm_image(camera_index=0, save_path="my_palm.jpg"):
             print("❌ Capture cancelled")
             break
     
+    stop.set()
+    grabber.join()
     cap.release()
     cv2.destroyAllWindows()
     
@@ -105,7 +152,8 @@ def test_palm_recognition():
         
         # Visualize the palm analysis
         print("🔍 Analyzing palm...")
-        vis_image = system.visualize_palm_analysis(image_path, f"analysis_{Path(image_path).stem}.jpg")
+        vis_image = system.visualize_palm_analysis(image_path, f"analysis_{Path(image_path).stem}.jpg",
+                                                  draw_labels=True, draw_distance_lines=True)
         
         if vis_image is not None:
             print("✅ Palm analysis completed")
@@ -155,23 +203,35 @@ def demo_with_sample_images():
     # Look for sample images in the dataset
     dataset_path = Path("hand_keypoint_subset/images/val")
     if dataset_path.exists():
-        sample_images = list(dataset_path.glob("*.jpg"))[:3]  # Take first 3 images
+        sample_images = list(iter_jpgs(dataset_path, 3))  # Take first 3 images
         
         if sample_images:
             print(f"📊 Found {len(sample_images)} sample images")
             
-            for i, image_path in enumerate(sample_images):
+            # Detect all samples in one batched pass and reuse the keypoints
+            # for visualization, recognition and registration
+            detections = system.detect_hand_keypoints_batch(
+                [str(p) for p in sample_images], return_image=True
+            )
+            
+            for i, (image_path, detection) in enumerate(zip(sample_images, detections)):
                 print(f"\n--- Sample {i+1}: {image_path.name} ---")
                 
+                if detection is None:
+                    continue
+                
                 # Create visualization
                 vis_image = system.visualize_palm_analysis(
                     str(image_path), 
-                    f"sample_analysis_{i+1}.jpg"
+                    f"sample_analysis_{i+1}.jpg",
+                    draw_labels=True,
+                    draw_distance_lines=True,
+                    detection=detection
                 )
                 
                 if vis_image is not None:
                     # Try recognition
-                    result = system.recognize_palm(str(image_path))
+                    result = system.recognize_palm(str(image_path), detection=detection)
                     
                     if result and result['match']:
                         print(f"✅ Recognized as: {result['person_name']}")
@@ -180,7 +240,7 @@ def demo_with_sample_images():
                         
                         # Register as sample
                         person_name = f"Sample_{i+1}"
-                        system.register_palm(str(image_path), person_name)
+                        system.register_palm(str(image_path), person_name, detection=detection)
                         print(f"✅ Registered as: {person_name}")
         else:
             print("❌ No sample images found in dataset")
@@ -5,12 +5,58 @@ Tests the model on sample images and visualizes the results
 
 import cv2
 import numpy as np
+import torch
 from ultralytics import YOLO
 import matplotlib.pyplot as plt
 from pathlib import Path
 import os
+from functools import lru_cache
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 
-def test_model_on_image(model_path="./modal_training_results/best.pt", image_path="./modal_training_results/IMG_00000026.jpg", save_result=True):
+# Run on the first GPU in half precision when one is available
+DEVICE = 0 if torch.cuda.is_available() else 'cpu'
+HALF = torch.cuda.is_available()
+
+# Hand keypoint connections (MediaPipe hand landmarks)
+CONNECTIONS = np.array([
+    # Thumb
+    (0, 1), (1, 2), (2, 3), (3, 4),
+    # Index finger
+    (0, 5), (5, 6), (6, 7), (7, 8),
+    # Middle finger
+    (0, 9), (9, 10), (10, 11), (11, 12),
+    # Ring finger
+    (0, 13), (13, 14), (14, 15), (15, 16),
+    # Pinky
+    (0, 17), (17, 18), (18, 19), (19, 20)
+], dtype=np.int32)
+
+# Keypoint color by confidence (0-255): red to blue
+COLOR_LUT = np.stack([np.arange(256), np.zeros(256, dtype=np.int64), 255 - np.arange(256)], axis=1)
+
+def iter_jpgs(dir_path, limit=None):
+    """
+    Yield the .jpg files in a directory, in directory order
+    
+    Args:
+        dir_path: Directory to scan (a missing directory yields nothing)
+        limit: Stop after this many files (optional)
+    """
+    if not os.path.isdir(dir_path):
+        return
+    
+    # scandir with a suffix check avoids pathlib's fnmatch-based glob
+    with os.scandir(dir_path) as entries:
+        jpgs = (Path(entry.path) for entry in entries if entry.name.endswith('.jpg') and entry.is_file())
+        yield from islice(jpgs, limit)
+
+@lru_cache(maxsize=4)
+def load_model(model_path):
+    """Load a YOLO model once per path; later calls reuse the loaded weights"""
+    return YOLO(model_path)
+
+def test_model_on_image(model_path="./modal_training_results/best.pt", image_path="./modal_training_results/IMG_00000026.jpg", save_result=True, imgsz=640, visualize=True):
     """
     Test the trained model on a single image
     
@@ -18,6 +64,8 @@ def test_model_on_image(model_path="./modal_training_results/best.pt", image_pat
         model_path: Path to the trained model (.pt file)
         image_path: Path to the test image
         save_result: Whether to save the result image
+        imgsz: Inference size; larger images are downscaled to it up front
+        visualize: Whether to draw the keypoints (required for save_result)
     """
     
     print(f"🔍 Testing model: {model_path}")
@@ -25,7 +73,7 @@ def test_model_on_image(model_path="./modal_training_results/best.pt", image_pat
     
     # Load the trained model
     try:
-        model = YOLO(model_path)
+        model = load_model(model_path)
         print("✅ Model loaded successfully")
     except Exception as e:
         print(f"❌ Failed to load model: {e}")
@@ -38,9 +86,14 @@ def test_model_on_image(model_path="./modal_training_results/best.pt", image_pat
             print(f"❌ Could not load image: {image_path}")
             return None
         
-        # Convert BGR to RGB for display
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         print(f"✅ Image loaded: {image.shape}")
+        
+        # Downscale large photos once, before inference and the color
+        # conversion, so neither touches the full-resolution pixels
+        height, width = image.shape[:2]
+        scale = min(1.0, imgsz / max(height, width))
+        if scale < 1.0:
+            image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
     except Exception as e:
         print(f"❌ Failed to load image: {e}")
         return None
@@ -48,48 +101,69 @@ def test_model_on_image(model_path="./modal_training_results/best.pt", image_pat
     # Run inference
     try:
         print("🚀 Running inference...")
-        results = model(image)
+        with torch.inference_mode():
+            results = model(image, device=DEVICE, half=HALF, imgsz=imgsz, verbose=False)
         
         if len(results) == 0:
             print("❌ No results returned")
             return None
         
-        result = results[0]
         print("✅ Inference completed")
+        return process_result(results[0], image, image_path, save_result, scale, visualize)
         
-        # Check if keypoints were detected
-        if result.keypoints is None or len(result.keypoints) == 0:
-            print("❌ No hand keypoints detected")
-            return None
-        
-        keypoints = result.keypoints.xy[0].cpu().numpy()  # Shape: (21, 2)
-        confidences = result.keypoints.conf[0].cpu().numpy()  # Shape: (21,)
-        
-        print(f"✅ Detected {len(keypoints)} keypoints")
-        print(f"   Average confidence: {np.mean(confidences):.3f}")
-        print(f"   Min confidence: {np.min(confidences):.3f}")
-        print(f"   Max confidence: {np.max(confidences):.3f}")
-        
-        # Visualize results
-        result_image = visualize_keypoints(image_rgb, keypoints, confidences)
+    except Exception as e:
+        print(f"❌ Inference failed: {e}")
+        return None
+
+def process_result(result, image, image_path, save_result=True, scale=1.0, visualize=True):
+    """
+    Report and visualize the keypoints of one inference result
+    
+    Args:
+        result: YOLO result for the image
+        image: The image inference ran on (BGR)
+        image_path: Path of the input image, used to name the output
+        save_result: Whether to save the result image
+        scale: Factor the original image was resized by before inference
+        visualize: Whether to draw the keypoints (required for save_result)
+    """
+    
+    # Check if keypoints were detected
+    if result.keypoints is None or len(result.keypoints) == 0:
+        print("❌ No hand keypoints detected")
+        return None
+    
+    # Copy coordinates and confidences to the host in one transfer
+    kp = result.keypoints
+    data = torch.cat([kp.xy[0], kp.conf[0].unsqueeze(-1)], dim=-1).cpu().numpy()
+    keypoints, confidences = data[:, :2], data[:, 2]  # Shapes: (21, 2), (21,)
+    
+    print(f"✅ Detected {len(keypoints)} keypoints")
+    print(f"   Average confidence: {np.mean(confidences):.3f}")
+    print(f"   Min confidence: {np.min(confidences):.3f}")
+    print(f"   Max confidence: {np.max(confidences):.3f}")
+    
+    # Visualize results (convert BGR to RGB for display); statistics-only
+    # runs skip the drawing and the JPEG encode
+    result_image = None
+    if visualize:
+        # cvtColor already returns a new buffer, so draw on it directly
+        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        result_image = visualize_keypoints(image_rgb, keypoints, confidences, copy=False)
         
         if save_result:
             output_path = f"test_result_{Path(image_path).stem}.jpg"
             cv2.imwrite(output_path, cv2.cvtColor(result_image, cv2.COLOR_RGB2BGR))
             print(f"💾 Result saved to: {output_path}")
-        
-        return {
-            'keypoints': keypoints,
-            'confidences': confidences,
-            'result_image': result_image,
-            'success': True
-        }
-        
-    except Exception as e:
-        print(f"❌ Inference failed: {e}")
-        return None
+    
+    return {
+        'keypoints': keypoints / np.float32(scale),  # Original image coordinates
+        'confidences': confidences,
+        'result_image': result_image,
+        'success': True
+    }
 
-def visualize_keypoints(image, keypoints, confidences, threshold=0.5):
+def visualize_keypoints(image, keypoints, confidences, threshold=0.5, copy=True):
     """
     Visualize hand keypoints on the image
     
@@ -98,54 +172,40 @@ def visualize_keypoints(image, keypoints, confidences, threshold=0.5):
         keypoints: Array of keypoint coordinates (21, 2)
         confidences: Array of keypoint confidences (21,)
         threshold: Confidence threshold for displaying keypoints
+        copy: Draw on a copy; pass False to draw in place on a scratch image
     """
     
     # Create a copy of the image
-    result_image = image.copy()
-    
-    # Define hand keypoint connections (MediaPipe hand landmarks)
-    connections = [
-        # Thumb
-        (0, 1), (1, 2), (2, 3), (3, 4),
-        # Index finger
-        (0, 5), (5, 6), (6, 7), (7, 8),
-        # Middle finger
-        (0, 9), (9, 10), (10, 11), (11, 12),
-        # Ring finger
-        (0, 13), (13, 14), (14, 15), (15, 16),
-        # Pinky
-        (0, 17), (17, 18), (18, 19), (19, 20)
-    ]
+    result_image = image.copy() if copy else image
     
-    # Draw connections
-    for start_idx, end_idx in connections:
-        if (confidences[start_idx] > threshold and 
-            confidences[end_idx] > threshold):
-            
-            start_point = tuple(keypoints[start_idx].astype(int))
-            end_point = tuple(keypoints[end_idx].astype(int))
-            
-            cv2.line(result_image, start_point, end_point, (0, 255, 0), 2)
+    # Draw connections whose endpoints are both confident
+    valid = (confidences[CONNECTIONS[:, 0]] > threshold) & (confidences[CONNECTIONS[:, 1]] > threshold)
+    starts = keypoints[CONNECTIONS[valid, 0]].astype(np.int32).tolist()
+    ends = keypoints[CONNECTIONS[valid, 1]].astype(np.int32).tolist()
+    for start_point, end_point in zip(starts, ends):
+        cv2.line(result_image, tuple(start_point), tuple(end_point), (0, 255, 0), 2)
     
     # Draw keypoints
-    for i, (kp, conf) in enumerate(zip(keypoints, confidences)):
-        if conf > threshold:
-            point = tuple(kp.astype(int))
-            # Color code by confidence
-            color_intensity = int(255 * conf)
-            color = (color_intensity, 0, 255 - color_intensity)  # Red to blue
-            
-            cv2.circle(result_image, point, 4, color, -1)
-            cv2.circle(result_image, point, 6, (255, 255, 255), 1)
-            
-            # Add keypoint number
-            cv2.putText(result_image, str(i), 
-                       (point[0] + 8, point[1] - 8), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+    kp_mask = confidences > threshold
+    indices = np.flatnonzero(kp_mask).tolist()
+    points = keypoints[kp_mask].astype(np.int32).tolist()
+    # Color code by confidence
+    colors = COLOR_LUT[(255 * confidences[kp_mask]).astype(np.uint8)].tolist()
+    for i, point, color in zip(indices, points, colors):
+        point = tuple(point)
+        color = tuple(color)
+        
+        cv2.circle(result_image, point, 4, color, -1)
+        cv2.circle(result_image, point, 6, (255, 255, 255), 1)
+        
+        # Add keypoint number
+        cv2.putText(result_image, str(i), 
+                   (point[0] + 8, point[1] - 8), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
     
     return result_image
 
-def test_model_on_dataset(model_path="./modal_training_results/best.pt", dataset_path="hand_keypoint_subset", num_samples=5):
+def test_model_on_dataset(model_path="./modal_training_results/best.pt", dataset_path="hand_keypoint_subset", num_samples=5, visualize=False):
     """
     Test the model on multiple images from the dataset
     
@@ -153,39 +213,76 @@ def test_model_on_dataset(model_path="./modal_training_results/best.pt", dataset
         model_path: Path to the trained model
         dataset_path: Path to the dataset directory
         num_samples: Number of test images to use
+        visualize: Draw and save a result image per sample; otherwise only
+            the confidence statistics are collected
     """
     
     print(f"🧪 Testing model on {num_samples} samples from dataset...")
     
-    # Find test images
+    # Find test images, preferring the validation split; the directory scan
+    # stops once enough images are found
     dataset_path = Path(dataset_path)
-    train_images = list((dataset_path / "images" / "train").glob("*.jpg"))
-    val_images = list((dataset_path / "images" / "val").glob("*.jpg"))
+    test_images = list(iter_jpgs(dataset_path / "images" / "val", num_samples))
+    if not test_images:
+        test_images = list(iter_jpgs(dataset_path / "images" / "train", num_samples))
     
-    if len(train_images) == 0 and len(val_images) == 0:
+    if len(test_images) == 0:
         print("❌ No images found in dataset")
         return
     
-    # Use validation images for testing
-    test_images = val_images[:num_samples] if val_images else train_images[:num_samples]
-    
     print(f"📊 Found {len(test_images)} test images")
     
-    results = []
-    for i, image_path in enumerate(test_images):
-        print(f"\n--- Test {i+1}/{len(test_images)} ---")
-        result = test_model_on_image(model_path, image_path, save_result=True)
-        if result:
-            results.append(result)
+    # Load the model once and run all images through it in batches
+    try:
+        model = load_model(model_path)
+        print(f"✅ Model loaded: {model_path}")
+    except Exception as e:
+        print(f"❌ Failed to load model: {e}")
+        return
+    
+    batch_size = min(len(test_images), 8)
+    # Only per-image statistics are kept, so memory stays at one batch of
+    # images and results however many samples are tested
+    mean_confidences = []
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor, torch.inference_mode():
+            # cv2 releases the GIL while decoding, so the next batch is read
+            # in the background while the current one runs through the model
+            def read_batch(start):
+                return [executor.submit(cv2.imread, str(p)) for p in test_images[start:start + batch_size]]
+            
+            pending = read_batch(0)
+            for start in range(0, len(test_images), batch_size):
+                images = [future.result() for future in pending]
+                pending = read_batch(start + batch_size)
+                
+                # Run the batch to completion so the predictor is finished with
+                # it (and its stream state released) before results are processed
+                loaded = [image for image in images if image is not None]
+                predictions = iter(model(loaded, batch=len(loaded), device=DEVICE, half=HALF, verbose=False)
+                                   if loaded else ())
+                
+                for offset, image in enumerate(images):
+                    image_path = test_images[start + offset]
+                    print(f"\n--- Test {start + offset + 1}/{len(test_images)}: {image_path.name} ---")
+                    if image is None:
+                        print(f"❌ Could not load image: {image_path}")
+                        continue
+                    
+                    result = process_result(next(predictions), image, image_path,
+                                            save_result=visualize, visualize=visualize)
+                    if result:
+                        mean_confidences.append(float(np.mean(result['confidences'])))
+    except Exception as e:
+        print(f"❌ Inference failed: {e}")
     
     # Summary
-    if results:
-        avg_confidences = [np.mean(r['confidences']) for r in results]
+    if mean_confidences:
         print(f"\n📈 Test Summary:")
-        print(f"   Successful detections: {len(results)}/{len(test_images)}")
-        print(f"   Average confidence: {np.mean(avg_confidences):.3f}")
-        print(f"   Min confidence: {np.min(avg_confidences):.3f}")
-        print(f"   Max confidence: {np.max(avg_confidences):.3f}")
+        print(f"   Successful detections: {len(mean_confidences)}/{len(test_images)}")
+        print(f"   Average confidence: {np.mean(mean_confidences):.3f}")
+        print(f"   Min confidence: {np.min(mean_confidences):.3f}")
+        print(f"   Max confidence: {np.max(mean_confidences):.3f}")
     else:
         print("❌ No successful detections")
 
@@ -198,9 +295,16 @@ def find_trained_model():
         "./modal_training_results/last.pt",
         "./modal_training_results/weights/best.pt",
         "./modal_training_results/weights/last.pt",
+        "./hand_keypoint_training/subset_experiment/weights/best.pt",
     ]
     
+    # Check candidates in priority order, preferring each one's own export:
+    # the TensorRT engine on CUDA machines, the ONNX Runtime model on CPU-only ones
+    export_suffix = ".engine" if torch.cuda.is_available() else ".onnx"
     for path in possible_paths:
+        export_path = str(Path(path).with_suffix(export_suffix))
+        if os.path.exists(export_path):
+            return export_path
         if os.path.exists(path):
             return path
     
@@ -229,7 +333,7 @@ def main():
     dataset_path = "hand_keypoint_subset"
     if os.path.exists(dataset_path):
         print(f"\n🧪 Testing on dataset: {dataset_path}")
-        test_model_on_dataset(model_path, dataset_path, num_samples=3)
+        test_model_on_dataset(model_path, dataset_path, num_samples=3, visualize=True)
     else:
         print(f"\n⚠️  Dataset not found at: {dataset_path}")
         print("   Please provide a test image manually")
@@ -7,6 +7,7 @@ import os
 import torch
 from ultralytics import YOLO
 import yaml
+from build_trt_engine import build_mixed_precision_engine
 
 def check_gpu():
     """Check if GPU is available"""
@@ -18,12 +19,81 @@ def check_gpu():
         print("💻 Using CPU (GPU not available)")
         return False
 
+def count_jpgs(path):
+    """Count the .jpg files in a directory in a single scandir pass"""
+    with os.scandir(path) as entries:
+        return sum(1 for entry in entries if entry.name.endswith('.jpg') and entry.is_file())
+
+def export_tensorrt_engine(model_path, imgsz):
+    """
+    Export a trained model to an INT8 TensorRT engine next to the .pt file
+    
+    Args:
+        model_path: Path to the trained model (.pt file)
+        imgsz: Image size the model was trained at
+        
+    Returns:
+        Path to the exported engine, or None if the export failed
+    """
+    print("⚙️  Exporting INT8 TensorRT engine...")
+    try:
+        # INT8 calibration runs over the val split of the dataset YAML
+        engine_path = YOLO(model_path).export(
+            format='engine',
+            int8=True,
+            half=False,
+            dynamic=True,
+            batch=8,
+            workspace=4,
+            imgsz=imgsz,
+            data='hand-keypoints-subset.yaml'
+        )
+        print(f"✅ TensorRT engine saved to: {engine_path}")
+        return engine_path
+    except Exception as e:
+        print(f"⚠️  TensorRT export failed, keeping PyTorch weights only: {e}")
+        return None
+
+def export_onnx_model(model_path, imgsz):
+    """
+    Export a trained model to ONNX next to the .pt file, for CPU inference
+    with ONNX Runtime
+    
+    Args:
+        model_path: Path to the trained model (.pt file)
+        imgsz: Image size the model was trained at
+        
+    Returns:
+        Path to the exported model, or None if the export failed
+    """
+    print("⚙️  Exporting ONNX model...")
+    try:
+        onnx_path = YOLO(model_path).export(
+            format='onnx',
+            imgsz=imgsz,
+            opset=12,
+            simplify=True,
+            dynamic=False
+        )
+        print(f"✅ ONNX model saved to: {onnx_path}")
+        return onnx_path
+    except Exception as e:
+        print(f"⚠️  ONNX export failed, keeping PyTorch weights only: {e}")
+        return None
+
 def train_hand_model():
     """Train the hand keypoint detection model"""
     
     print("🔍 Checking system resources...")
     use_gpu = check_gpu()
     
+    if use_gpu:
+        # Inputs are always 416x416, so let cuDNN benchmark and keep the fastest
+        # conv algorithms; TF32 speeds up matmuls/convs on Ampere and newer
+        torch.backends.cudnn.benchmark = True
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32 = True
+    
     # Check if subset dataset exists
     subset_dir = "hand_keypoint_subset"
     if not os.path.exists(subset_dir):
@@ -32,8 +102,8 @@ def train_hand_model():
         return
     
     # Check dataset files
-    train_images = len([f for f in os.listdir(f"{subset_dir}/images/train") if f.endswith('.jpg')])
-    val_images = len([f for f in os.listdir(f"{subset_dir}/images/val") if f.endswith('.jpg')])
+    train_images = count_jpgs(f"{subset_dir}/images/train")
+    val_images = count_jpgs(f"{subset_dir}/images/val")
     
     print(f"📊 Dataset subset loaded:")
     print(f"   Training images: {train_images}")
@@ -54,7 +124,9 @@ def train_hand_model():
         'imgsz': 416,  # Smaller image size for faster training
         'batch': 8 if use_gpu else 4,  # Smaller batch size
         'device': 'cuda' if use_gpu else 'cpu',
-        'workers': 2,  # Reduced workers for stability
+        # Keep the GPU fed; Ultralytics' InfiniteDataLoader already keeps workers alive across epochs
+        'workers': max(4, (os.cpu_count() or 1) // 2) if use_gpu else 2,
+        'cache': 'ram' if use_gpu else False,  # Decoded 416px subset is ~0.5 GB; only worth the RAM when the GPU is waiting on decodes
         'patience': 10,  # Early stopping
         'save_period': 10,  # Save checkpoint every 10 epochs
         'project': 'hand_keypoint_training',
@@ -83,17 +155,8 @@ def train_hand_model():
         'plots': True,  # Generate training plots
         'save_json': True,  # Save results in JSON format
         'save_hybrid': False,
-        'conf': None,
-        'iou': 0.7,
-        'max_det': 300,
         'half': use_gpu,  # Use half precision if GPU available
-        'dnn': False,
-        'vid_stride': 1,
-        'line_width': None,
-        'visualize': False,
         'augment': True,  # Enable data augmentation
-        'agnostic_nms': False,
-        'classes': None,
         'single_cls': False,
         'rect': False,
         'cos_lr': False,
@@ -104,34 +167,10 @@ def train_hand_model():
         'profile': False,
         'freeze': None,
         'multi_scale': False,
-        'overlap_mask': True,
-        'mask_ratio': 4,
-        'dropout': 0.0,
-        'val': True,
-        'split': 'val',
-        'save_dir': 'runs/pose/train',
-        'verbose': True,
-        'seed': 0,
-        'deterministic': True,
-        'single_cls': False,
-        'rect': False,
-        'cos_lr': False,
-        'close_mosaic': 10,
-        'resume': False,
-        'amp': use_gpu,
-        'fraction': 1.0,
-        'profile': False,
-        'freeze': None,
-        'multi_scale': False,
-        'overlap_mask': True,
-        'mask_ratio': 4,
-        'dropout': 0.0,
-        'val': True,
         'split': 'val',
-        'save_dir': 'runs/pose/train',
         'verbose': True,
         'seed': 0,
-        'deterministic': True
+        'deterministic': False  # Deterministic cuDNN kernels cost throughput this run doesn't need
     }
     
     print("🚀 Starting training...")
@@ -150,6 +189,19 @@ def train_hand_model():
         print(f"🏆 Best model: {results.save_dir}/weights/best.pt")
         print(f"📊 Last model: {results.save_dir}/weights/last.pt")
         
+        # TensorRT needs a CUDA device to build the engine
+        best_model = f"{results.save_dir}/weights/best.pt"
+        if use_gpu:
+            if val_images < 200:
+                print(f"⚠️  Only {val_images} validation images for INT8 calibration, accuracy may suffer")
+            # Prefer the mixed INT8/FP16 build; pure INT8 is the fallback
+            if not build_mixed_precision_engine(best_model, subset_dir, imgsz=training_args['imgsz']):
+                export_tensorrt_engine(best_model, training_args['imgsz'])
+        
+        # Static ONNX for CPU-only machines; exported last so it replaces the
+        # dynamic-shape ONNX the engine build leaves behind
+        export_onnx_model(best_model, training_args['imgsz'])
+        
         # Print training summary
         if hasattr(results, 'results_dict'):
             print("\n📈 Training Summary:")